@@ -0,0 +1,50 @@
+from collections import namedtuple
+
+# Declarative achievement rules.
+#
+# Each rule watches one metric and is earned once the metric reaches its
+# threshold. Callers pass only the metrics their change affected, so only the
+# rules watching those metrics are evaluated.
+
+AchievementRule = namedtuple('AchievementRule', 'name description badge_icon metric threshold')
+
+# Metrics a rule can watch
+HABIT_COUNT = 'habit_count'      # Number of habits the user has
+HABIT_STREAK = 'habit_streak'    # Streak of the habit that just changed
+TOTAL_STREAK = 'total_streak'    # Sum of the user's habit streaks
+
+ACHIEVEMENT_RULES = (
+    AchievementRule('Habit Pioneer', 'Created your first habit!', 'fa-star', HABIT_COUNT, 1),
+    AchievementRule('Week Warrior', 'Maintained a 7-day streak', 'fa-fire', TOTAL_STREAK, 7),
+    AchievementRule('Monthly Master', 'Maintained a 30-day streak', 'fa-crown', TOTAL_STREAK, 30),
+    AchievementRule('Habit Hero', 'Maintained a 100-day streak', 'fa-trophy', TOTAL_STREAK, 100),
+)
+
+
+def index_rules(rules):
+    """Group rules by the metric they watch"""
+    by_metric = {}
+    for rule in rules:
+        by_metric.setdefault(rule.metric, []).append(rule)
+    return by_metric
+
+
+RULES_BY_METRIC = index_rules(ACHIEVEMENT_RULES)
+
+
+def evaluate(metrics, earned, rules_by_metric=RULES_BY_METRIC):
+    """Rules newly satisfied by ``metrics`` that are not in the ``earned`` names"""
+    awarded = []
+    for metric, value in metrics.items():
+        for rule in rules_by_metric.get(metric, ()):
+            if value >= rule.threshold and rule.name not in earned:
+                awarded.append(rule)
+    return awarded
+
+
+def to_dict(rule):
+    return {
+        'name': rule.name,
+        'description': rule.description,
+        'badge_icon': rule.badge_icon
+    }
@@ -1,31 +1,199 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, g, has_app_context, has_request_context, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_bcrypt import Bcrypt
 from datetime import datetime, timedelta
 import os
 from datetime import datetime, timedelta
 import json
-from flask_mail import Mail, Message
 import csv
-from io import StringIO
-
-# Initialize Flask app and configuration
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY") # For session management
-bcrypt = Bcrypt(app)
+from io import StringIO, TextIOWrapper
+from sqlalchemy.dialects import postgresql, sqlite
+import click
+import hashlib
+import random
+import re
+import time
+from functools import wraps
+import achievements as achievement_rules
+import assets
+import bitmaps
+from streaks import (FREQUENCIES, completion_series, date_labels, merge_month, pack_month,
+                     period_index, period_rollups, period_start, unpack_month)
+from cache import ResultCache, TTLCache, make_backend
+from passwords import HasherBusy, PasswordHasher
+from metrics import Registry, STATEMENT_BUCKETS, repeated_statements
+from sqlalchemy import DDL, event
+from sqlalchemy.engine import Engine
+
+# Extensions are created unbound and attached to an app by create_app(), so
+# importing this module does no I/O. The schema is created by `flask init-db`
+# (or `flask upgrade-db`), never at import time.
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+bcrypt = Bcrypt()
+
+# Threads running the Flask routes in each ASGI worker (see asgi.py)
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 8))
+
+# Password hashing runs on a bounded process pool; requests beyond
+# HASH_MAX_PENDING queued hashes per worker are answered with a 503. Every
+# pending hash holds one of the WSGI_THREADS while it waits, so the limit is
+# kept below the thread count (two hashes per pool process by default) and
+# other routes keep threads to run on during a login burst.
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 2))
+HASH_MAX_PENDING = max(1, min(int(os.getenv('HASH_MAX_PENDING', 2 * HASH_WORKERS)), WSGI_THREADS - 1))
+password_hasher = PasswordHasher(
+    rounds=BCRYPT_LOG_ROUNDS,
+    workers=HASH_WORKERS,
+    max_pending=HASH_MAX_PENDING
+)
 
 # Configure SQLAlchemy with PostgreSQL connection string
 DATABASE_URL = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool: pre-ping replaces connections the server has dropped and
+# recycle bounds their age; sizing is only passed through when configured
+engine_options = {
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+}
+for option, variable in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                         ('pool_timeout', 'DB_POOL_TIMEOUT')):
+    if os.getenv(variable):
+        engine_options[option] = int(os.getenv(variable))
+
+# Read replicas (comma separated URLs) serve the routes marked @read_replica.
+# Locally, a copy of a SQLite file works: REPLICA_DATABASE_URLS=sqlite:////tmp/replica.db
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv('REPLICA_DATABASE_URLS', '').split(',') if url.strip()]
+REPLICA_BINDS = [f'replica{i}' for i in range(len(REPLICA_DATABASE_URLS))]
+
+# After a user's own write their reads stay on the primary for this many
+# seconds, so they never see a replica that has not caught up yet
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+class RoutingSession(FlaskSession):
+    """Session that sends the reads of a @read_replica request to its replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('replica_bind') \
+                and not self._flushing and not getattr(clause, 'is_dml', False):
+            return db.engines[g.replica_bind]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
 
 
 # Initialize SQLAlchemy and Flask-Login
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'  # Redirect to login page if not logged in
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'  # Redirect to login page if not logged in
+
+# Every route, hook and CLI command below is registered on this blueprint;
+# cli_group=None keeps the commands at the top level (`flask upgrade-db`)
+bp = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config=None):
+    """Application factory: ``flask --app app`` and ``gunicorn 'app:create_app()'`` call it.
+
+    Building the app only reads configuration and wires up extensions; the
+    database is first contacted by the first request that needs it.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv("SECRET_KEY") # For session management
+    app.config['BCRYPT_LOG_ROUNDS'] = BCRYPT_LOG_ROUNDS
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    app.config['SQLALCHEMY_BINDS'] = dict(zip(REPLICA_BINDS, REPLICA_DATABASE_URLS))
+    app.config['ASSET_MANIFEST'] = assets.load_manifest(app.static_folder)
+    app.config.update(config or {})
+
+    bcrypt.init_app(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+def dispose_engines(app):
+    """Drop pooled connections inherited from a parent process (see gunicorn.conf.py)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+# Windows (in days) the analytics page can be rendered for
+ANALYTICS_WINDOWS = (30, 90, 365)
+
+# Number of users shown per leaderboard page
+LEADERBOARD_PAGE_SIZE = 50
+
+# Notes returned per page of a habit's notes or of a note search, and the most a client may ask for
+NOTES_PAGE_SIZE = 20
+NOTES_MAX_PAGE_SIZE = 100
+
+# Most entries accepted by one bulk completion update
+BULK_UPDATE_MAX_ENTRIES = 1000
+
+# Longest window the calendar range endpoint will encode
+CALENDAR_MAX_RANGE_DAYS = 366
+
+# Rows fetched from the server-side cursor per chunk of an export
+EXPORT_CHUNK_SIZE = 1000
+
+# Completion rows bulk-loaded per batch by the history import
+IMPORT_BATCH_SIZE = 10000
+
+# Notification stream (ASGI tier): how often it checks for changes, how long one
+# connection is held before the browser reconnects, and the keep-alive comment
+# interval (seconds). Polls compare the user's cache version; with an in-process
+# cache that misses other workers' writes, so the notifications are also
+# rebuilt from the database every NOTIFICATION_RESYNC_SECONDS.
+NOTIFICATION_POLL_SECONDS = 2
+NOTIFICATION_STREAM_SECONDS = 55
+NOTIFICATION_KEEPALIVE_SECONDS = 15
+NOTIFICATION_RESYNC_SECONDS = 30
+
+# Serve analytics from the habit_rollups table once it has been backfilled
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', '0') == '1'
+
+# Number of habits the rollup worker backfills per transaction
+ROLLUP_BATCH_SIZE = 200
+
+# Serve streaks, date lookups, calendar ranges and analytics from
+# habit_completion_bitmaps once build-completion-bitmaps has run; write paths
+# only keep the bitmaps up to date while this is on
+BITMAPS_ENABLED = os.getenv('BITMAPS_ENABLED', '0') == '1'
+
+# Completions older than this many days (rounded down to a month boundary) are
+# compacted into habit_completion_archive. Analytics reads only the hot table,
+# so the horizon never drops below its longest window. Months already archived
+# stay archived if it is raised; reads find them through archive_horizon().
+COMPLETION_HOT_DAYS = max(int(os.getenv('COMPLETION_HOT_DAYS', 400)), max(ANALYTICS_WINDOWS))
+
+# Requests slower than this many milliseconds are logged with their SQL (0 disables)
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
+# A statement repeated this many times in one request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Bearer token required by /metrics when set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Fingerprinted assets from `flask build-assets`; their names change with their
+# content, so browsers may keep them for a year without revalidating
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', assets.DIST_DIR)
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Authenticated identities cached per worker, so @login_required routes skip the
+# users table; a deleted user stops being served after at most USER_CACHE_TTL seconds
+user_cache = TTLCache(
+    max_entries=int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 60))
+)
+
+# Per-user result cache; set CACHE_URL=redis://... to share it between workers
+result_cache = ResultCache(make_backend(
+    os.getenv('CACHE_URL'),
+    int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+))
 
 
 
@@ -46,6 +214,7 @@ class Habit(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     streak = db.Column(db.Integer, default=0)
     last_completed = db.Column(db.Date)
+    categories = db.relationship('Category', secondary='habit_categories', lazy='select', viewonly=True)
 
 # Define HabitCompletion model
 class HabitCompletion(db.Model):
@@ -57,6 +226,22 @@ class HabitCompletion(db.Model):
     is_completed = db.Column(db.Boolean, nullable=False)
     habit = db.relationship('Habit', backref='habit_completions')
 
+    __table_args__ = (
+        # One row per habit per day; also serves (habit_id, user_id, completion_date) lookups
+        db.Index('uq_habit_completions_habit_date', 'habit_id', 'completion_date', unique=True),
+        db.Index('ix_habit_completions_user_date', 'user_id', 'completion_date'),
+    )
+
+# Running per-user streak totals, maintained as habit streaks change
+class LeaderboardEntry(db.Model):
+    __tablename__ = 'leaderboard'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_streak = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_leaderboard_total_streak', 'total_streak', 'user_id'),
+    )
+
 class Category(db.Model):
     __tablename__ = 'categories'
     id = db.Column(db.Integer, primary_key=True)
@@ -70,6 +255,10 @@ class HabitCategory(db.Model):
     habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
 
+# Text search configuration of the PostgreSQL note index; a literal so the
+# index expression and the search query compile to the same SQL
+NOTE_TEXT_SEARCH_CONFIG = db.literal_column("'english'")
+
 class HabitNote(db.Model):
     __tablename__ = 'habit_notes'
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +267,31 @@ class HabitNote(db.Model):
     note = db.Column(db.Text, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Backs keyset pagination of a habit's notes, newest first
+        db.Index('ix_habit_notes_habit_date_id', 'habit_id', 'date', 'id'),
+        # Full-text index over the note text; SQLite uses the FTS5 table below
+        db.Index('ix_habit_notes_note_fts', db.func.to_tsvector(NOTE_TEXT_SEARCH_CONFIG, note),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+# FTS5 index of habit_notes.note on SQLite, kept in sync by triggers
+NOTE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS habit_notes_fts USING fts5("
+    "note, content='habit_notes', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS habit_notes_fts_insert AFTER INSERT ON habit_notes BEGIN "
+    "INSERT INTO habit_notes_fts(rowid, note) VALUES (new.id, new.note); END",
+    "CREATE TRIGGER IF NOT EXISTS habit_notes_fts_delete AFTER DELETE ON habit_notes BEGIN "
+    "INSERT INTO habit_notes_fts(habit_notes_fts, rowid, note) VALUES ('delete', old.id, old.note); END",
+    "CREATE TRIGGER IF NOT EXISTS habit_notes_fts_update AFTER UPDATE ON habit_notes BEGIN "
+    "INSERT INTO habit_notes_fts(habit_notes_fts, rowid, note) VALUES ('delete', old.id, old.note); "
+    "INSERT INTO habit_notes_fts(rowid, note) VALUES (new.id, new.note); END",
+)
+for statement in NOTE_FTS_DDL:
+    event.listen(HabitNote.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(HabitNote.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS habit_notes_fts").execute_if(dialect='sqlite'))
+
 class Achievement(db.Model):
     __tablename__ = 'achievements'
     id = db.Column(db.Integer, primary_key=True)
@@ -87,15 +301,220 @@ class Achievement(db.Model):
     badge_icon = db.Column(db.String(50))  # Font Awesome icon class
     earned_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_achievements_user_name', 'user_id', 'name'),
+    )
 
-# Initialize the database if needed
-with app.app_context():
-    db.create_all()
+
+# Per-habit summary of completions by day, ISO week and month. Rows only exist
+# for periods that have completion rows; streak is the running streak ending at
+# that period (0 when nothing was completed in it).
+class HabitRollup(db.Model):
+    __tablename__ = 'habit_rollups'
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)  # daily, weekly or monthly
+    period_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    not_completed = db.Column(db.Integer, nullable=False, default=0)
+    streak = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_habit_rollups_user_period', 'user_id', 'period', 'period_start'),
+    )
+
+# Cursor of the rollup backfill worker
+class RollupProgress(db.Model):
+    __tablename__ = 'rollup_progress'
+    id = db.Column(db.Integer, primary_key=True)
+    last_habit_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Last one-time data migration `flask upgrade-db` has applied (see UPGRADE_STEPS)
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Habits whose rollups are behind their completions while ROLLUPS_ENABLED is
+# off; the rollup worker rebuilds them from ``since`` (the whole history when
+# NULL) and drops the entry unless it was queued again in the meantime.
+class RollupQueue(db.Model):
+    __tablename__ = 'rollup_queue'
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    since = db.Column(db.Date, nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+# Completions past the hot horizon, compacted to one row per habit and month.
+# Bit d-1 of completed_days / missed_days is set when day d was recorded as
+# completed / not completed.
+class CompletionArchive(db.Model):
+    __tablename__ = 'habit_completion_archive'
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    completed_days = db.Column(db.Integer, nullable=False, default=0)
+    missed_days = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_habit_completion_archive_user_month', 'user_id', 'month'),
+    )
+
+# Per-habit, per-year completion bitmaps (see bitmaps.py), derived from the
+# completion rows and the archive and kept up to date by every write path
+# while BITMAPS_ENABLED
+class CompletionBitmap(db.Model):
+    __tablename__ = 'habit_completion_bitmaps'
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    completed = db.Column(db.LargeBinary, nullable=False)
+    missed = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_habit_completion_bitmaps_user_year', 'user_id', 'year'),
+    )
+
+# Request and SQL instrumentation exposed at /metrics
+metrics = Registry()
+metrics.histogram('habit_tracker_request_duration_seconds', 'Request latency by endpoint.')
+metrics.histogram('habit_tracker_request_sql_statements', 'SQL statements issued per request.', STATEMENT_BUCKETS)
+metrics.counter('habit_tracker_requests_total', 'Requests by endpoint and status.')
+metrics.counter('habit_tracker_sql_statements_total', 'SQL statements by endpoint.')
+metrics.counter('habit_tracker_sql_duration_seconds_total', 'Time spent in SQL by endpoint.')
+metrics.counter('habit_tracker_n_plus_one_total', 'Requests that repeated one statement N_PLUS_ONE_THRESHOLD+ times.')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['statement_start'].pop()
+    # Flask requests and the ASGI tier's run_shared() calls both collect into g
+    if has_app_context() and 'sql_statements' in g:
+        g.sql_statements.append((statement, duration))
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql_statements = []
+
+@bp.after_app_request
+def record_request(response):
+    if 'request_start' not in g:
+        return response
+    observe_request(request.endpoint or 'unknown', request.method, request.path, response.status_code,
+                    time.perf_counter() - g.request_start, g.sql_statements, current_app.logger)
+    return response
+
+def observe_request(endpoint, method, path, status, duration, statements, logger):
+    """Feed one request's latency and (statement, duration) pairs into the /metrics registry and logs"""
+    metrics.observe('habit_tracker_request_duration_seconds', duration, endpoint=endpoint, method=method)
+    metrics.observe('habit_tracker_request_sql_statements', len(statements), endpoint=endpoint)
+    metrics.inc('habit_tracker_requests_total', endpoint=endpoint, method=method, status=status)
+    metrics.inc('habit_tracker_sql_statements_total', len(statements), endpoint=endpoint)
+    metrics.inc('habit_tracker_sql_duration_seconds_total', sum(d for _, d in statements), endpoint=endpoint)
+
+    repeated = repeated_statements([statement for statement, _ in statements], N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        metrics.inc('habit_tracker_n_plus_one_total', endpoint=endpoint)
+        for statement, count in repeated.items():
+            logger.warning(f"Possible N+1 in {endpoint}: statement ran {count} times: {statement}")
+
+    if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+        details = '\n'.join(f"  {d * 1000:.1f} ms  {statement}" for statement, d in statements)
+        logger.warning(f"Slow request {method} {path} took {duration * 1000:.0f} ms "
+                       f"with {len(statements)} statements:\n{details}")
+
+@bp.after_app_request
+def remember_write(response):
+    # Start the user's read-your-writes window on the primary
+    if REPLICA_BINDS and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        session['last_write_at'] = time.time()
+    return response
+
+# Route decorator: serve the request's reads from a replica unless the user
+# wrote within REPLICA_STICKY_SECONDS
+def read_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if REPLICA_BINDS and time.time() - session.get('last_write_at', 0) >= REPLICA_STICKY_SECONDS:
+            g.replica_bind = random.choice(REPLICA_BINDS)
+        return view(*args, **kwargs)
+    return wrapper
 
 # Load user for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        # Transient copy of the minimal record; never added to the session
+        return User(**cached)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    user_cache.set(user_id, {'id': user.id, 'username': user.username})
+    return user
+
+# Conditional GET for JSON routes. With a shared cache backend the ETag is
+# derived from the user's data version (or from ``etag_for`` when given), so a
+# matching If-None-Match is answered with 304 before the view builds its body.
+# The in-process backend only counts this worker's writes, and a version-based
+# ETag would let another worker's 304 hide them; there the ETag is a hash of
+# the body instead, which only saves the transfer.
+def conditional_get(etag_for=None, extra=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            if etag_for is None and not result_cache.shared:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.add_etag()
+                response.make_conditional(request)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            if etag_for is not None:
+                etag = etag_for()
+            else:
+                etag = user_etag(request.full_path, current_user.id, *([extra()] if extra is not None else []))
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Private data: browsers may keep it but must revalidate every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def user_etag(full_path, user_id, *extra):
+    """ETag of a user's view of ``full_path`` at their current data version"""
+    parts = [full_path, user_id, result_cache.version_tag(user_id), *extra]
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+# Asset URLs for templates: the fingerprinted build when there is one, the
+# plain static files (one per bundle member) otherwise
+@bp.app_template_global()
+def asset_urls(name):
+    manifest = current_app.config['ASSET_MANIFEST']
+    if name in manifest:
+        return [url_for('main.serve_asset', filename=manifest[name])]
+    return [url_for('static', filename=member) for member in assets.BUNDLES.get(name, [name])]
+
+@bp.app_template_global()
+def asset_url(name):
+    return asset_urls(name)[0]
 
 # Function to ensure all values are JSON serializable
 def ensure_serializable(data):
@@ -109,287 +528,814 @@ def ensure_serializable(data):
     else:
         return data  # Return other types as-is
 
+def dialect_insert():
+    """Return the ON CONFLICT capable insert() for the bound database, if any"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    return None
+
+def upsert_completions(rows):
+    """Insert or update completion rows keyed on (habit_id, completion_date) in one statement"""
+    if not rows:
+        return
+    insert = dialect_insert()
+    if insert is None:
+        # No native upsert available, fall back to read-then-write
+        for row in rows:
+            completion = HabitCompletion.query.filter_by(
+                habit_id=row['habit_id'], completion_date=row['completion_date']).first()
+            if completion:
+                completion.is_completed = row['is_completed']
+            else:
+                db.session.add(HabitCompletion(**row))
+        db.session.flush()
+        return
+
+    stmt = insert(HabitCompletion).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['habit_id', 'completion_date'],
+        set_={'is_completed': stmt.excluded.is_completed}
+    )
+    db.session.execute(stmt)
+
+def refresh_leaderboard(user_id):
+    """Set a user's leaderboard total to the sum of their habit streaks, creating the entry if needed.
+
+    The total is summed in SQL rather than adjusted by a delta, so concurrent
+    streak updates cannot make it drift: the last writer stores the real sum.
+    """
+    db.session.flush()
+    total = db.select(db.func.coalesce(db.func.sum(Habit.streak), 0))\
+        .where(Habit.user_id == user_id).scalar_subquery()
+    insert = dialect_insert()
+    if insert is None:
+        entry = db.session.get(LeaderboardEntry, user_id)
+        if entry is None:
+            entry = LeaderboardEntry(user_id=user_id)
+            db.session.add(entry)
+        entry.total_streak = db.session.execute(db.select(total)).scalar()
+        return
+
+    stmt = insert(LeaderboardEntry).values(user_id=user_id, total_streak=total)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'total_streak': stmt.excluded.total_streak}
+    )
+    db.session.execute(stmt)
+
+def rebuild_leaderboard_totals():
+    """Recompute every user's leaderboard total from the habits table"""
+    totals = db.select(
+        User.id,
+        db.func.coalesce(db.func.sum(Habit.streak), 0)
+    ).outerjoin(Habit, User.id == Habit.user_id).group_by(User.id)
+
+    LeaderboardEntry.query.delete()
+    db.session.execute(db.insert(LeaderboardEntry).from_select(['user_id', 'total_streak'], totals))
+
+def completion_horizon(today):
+    """First day that is guaranteed to still be in the hot habit_completions table"""
+    return (today - timedelta(days=COMPLETION_HOT_DAYS)).replace(day=1)
+
+def archive_horizon(today):
+    """First day that cannot have been archived, whatever COMPLETION_HOT_DAYS was when compacting.
+
+    Compaction only archives months before the current completion_horizon(),
+    which is never later than this, so raising COMPLETION_HOT_DAYS cannot hide
+    months archived under a lower setting.
+    """
+    return (today - timedelta(days=max(ANALYTICS_WINDOWS))).replace(day=1)
+
+def completion_history(habit_ids, start=None, end=None, completed_only=False):
+    """(habit_id, completion_date, is_completed) rows of the given habits, by habit and date.
+
+    Reads the hot table and, when the range reaches back past archive_horizon(),
+    the archive too; a hot row wins over an archived day. ``end`` is exclusive.
+    """
+    if not habit_ids:
+        return []
+    query = db.session.query(HabitCompletion.habit_id, HabitCompletion.completion_date,
+                             HabitCompletion.is_completed).filter(HabitCompletion.habit_id.in_(habit_ids))
+    if start is not None:
+        query = query.filter(HabitCompletion.completion_date >= start)
+    if end is not None:
+        query = query.filter(HabitCompletion.completion_date < end)
+    days = {(habit_id, day): completed for habit_id, day, completed in query}
+
+    if start is None or start < archive_horizon(datetime.now().date()):
+        archived = CompletionArchive.query.filter(CompletionArchive.habit_id.in_(habit_ids))
+        if start is not None:
+            archived = archived.filter(CompletionArchive.month >= start.replace(day=1))
+        if end is not None:
+            archived = archived.filter(CompletionArchive.month < end)
+        for entry in archived:
+            for day, completed in unpack_month(entry.month, entry.completed_days, entry.missed_days):
+                if (start is None or day >= start) and (end is None or day < end):
+                    days.setdefault((entry.habit_id, day), completed)
+
+    return sorted((habit_id, day, completed) for (habit_id, day), completed in days.items()
+                  if completed or not completed_only)
+
+def apply_completion_bitmaps(rows):
+    """Set or clear the bits of completion rows just written by upsert_completions(); the caller commits.
+
+    Bitmaps are only maintained while BITMAPS_ENABLED; run build-completion-bitmaps
+    again before turning it back on.
+    """
+    if not BITMAPS_ENABLED:
+        return
+    by_year = {}
+    for row in rows:
+        key = (row['habit_id'], row['user_id'], row['completion_date'].year)
+        by_year.setdefault(key, []).append((row['completion_date'], row['is_completed']))
+
+    insert = dialect_insert()
+    for (habit_id, user_id, year), completions in by_year.items():
+        if insert is not None:
+            # Make sure the row exists first: FOR UPDATE locks nothing while it
+            # is missing, so two first writes of a year could both insert it
+            empty = bitmaps.encode(0)
+            db.session.execute(insert(CompletionBitmap).values(
+                habit_id=habit_id, year=year, user_id=user_id, completed=empty, missed=empty
+            ).on_conflict_do_nothing(index_elements=['habit_id', 'year']))
+        # Locked so concurrent writes to the same habit and year cannot drop each other's bits
+        bitmap = CompletionBitmap.query.filter_by(habit_id=habit_id, year=year)\
+            .with_for_update().populate_existing().first()
+        if bitmap is None:
+            completed, missed = bitmaps.year_masks(completions)
+            db.session.add(CompletionBitmap(habit_id=habit_id, year=year, user_id=user_id,
+                                            completed=bitmaps.encode(completed), missed=bitmaps.encode(missed)))
+        else:
+            completed, missed = bitmaps.year_masks(
+                completions, bitmaps.decode(bitmap.completed), bitmaps.decode(bitmap.missed))
+            bitmap.completed, bitmap.missed = bitmaps.encode(completed), bitmaps.encode(missed)
+
+def refresh_completion_bitmaps(habit_id, user_id, years):
+    """Rebuild a habit's completion bitmaps for ``years`` from its completion history"""
+    if not BITMAPS_ENABLED:
+        return
+    for year in sorted(set(years)):
+        first = datetime(year, 1, 1).date()
+        completed, missed = bitmaps.year_masks(
+            (day, is_completed)
+            for _, day, is_completed in completion_history([habit_id], first, first.replace(year=year + 1))
+        )
+        CompletionBitmap.query.filter_by(habit_id=habit_id, year=year).delete(synchronize_session=False)
+        if completed or missed:
+            db.session.add(CompletionBitmap(habit_id=habit_id, year=year, user_id=user_id,
+                                            completed=bitmaps.encode(completed), missed=bitmaps.encode(missed)))
+
+def load_completed_bitmaps(habit_ids):
+    """{habit_id: {year: completed mask}} for many habits in one query; habits without bitmaps are left out"""
+    years = {}
+    for habit_id, year, completed in db.session.query(
+            CompletionBitmap.habit_id, CompletionBitmap.year, CompletionBitmap.completed)\
+            .filter(CompletionBitmap.habit_id.in_(habit_ids)):
+        years.setdefault(habit_id, {})[year] = bitmaps.decode(completed)
+    return years
+
+# Streaks in SQL (gaps and islands). Completed days are numbered from
+# STREAK_EPOCH and mapped to the habit's period: the day itself, the ISO week
+# ((day + 3) // 7, since 1970-01-01 was a Thursday) or year * 12 + month.
+# Numbering distinct periods in order, period - row_number() is constant
+# along a run of consecutive periods, so grouping by it yields every run.
+STREAK_EPOCH = datetime(1970, 1, 1).date()
+
+def sql_day_number(column):
+    return db.cast(db.extract('epoch', column), db.BigInteger) // 86400
+
+def sql_month_number(column):
+    return db.cast(db.extract('year', column), db.Integer) * 12 + db.cast(db.extract('month', column), db.Integer) - 1
+
+def sql_add_days(column, days):
+    """``column`` plus ``days`` as a plain date, comparable with (and indexable against) date columns"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.func.date(column, db.func.printf('+%d days', days))
+    return column + days
+
+def habit_streaks(habit_ids, today):
+    """{habit_id: (current, last_completed)} for many habits in one statement.
+
+    ``current`` follows streaks.current_streak(); periods after ``today`` are
+    ignored. Habits without completions are left out.
+    """
+    if not habit_ids:
+        return {}
+    today_number = (today - STREAK_EPOCH).days
+
+    hot = db.select(
+        HabitCompletion.habit_id.label('habit_id'),
+        sql_day_number(HabitCompletion.completion_date).label('day'),
+        sql_month_number(HabitCompletion.completion_date).label('month')
+    ).where(HabitCompletion.habit_id.in_(habit_ids), HabitCompletion.is_completed.is_(True))
+
+    # Archived months expand to one row per completed bit; a hot row for the same day wins.
+    # The override is matched on the plain date so it is a lookup in the
+    # (habit_id, completion_date) unique index rather than a scan of the habit's rows.
+    offsets = db.union_all(*[db.select(db.literal_column(str(n)).label('n')) for n in range(31)]).subquery('offsets')
+    override = db.aliased(HabitCompletion)
+    archived = db.select(
+        CompletionArchive.habit_id,
+        (sql_day_number(CompletionArchive.month) + offsets.c.n).label('day'),
+        sql_month_number(CompletionArchive.month).label('month')
+    ).select_from(CompletionArchive).join(
+        offsets, CompletionArchive.completed_days.op('>>')(offsets.c.n).op('&')(1) == 1
+    ).where(
+        CompletionArchive.habit_id.in_(habit_ids),
+        ~db.exists().where(
+            override.habit_id == CompletionArchive.habit_id,
+            override.completion_date == sql_add_days(CompletionArchive.month, offsets.c.n)
+        )
+    )
+    days = db.union_all(hot, archived).cte('completed_days')
+
+    frequency = db.func.lower(Habit.habit_frequency)
+    period = db.case(
+        (frequency == 'weekly', (days.c.day + 3) // 7),
+        (frequency == 'monthly', days.c.month),
+        else_=days.c.day
+    )
+    now = db.case(
+        (frequency == 'weekly', (today_number + 3) // 7),
+        (frequency == 'monthly', today.year * 12 + today.month - 1),
+        else_=today_number
+    )
+    periods = db.select(days.c.habit_id, period.label('period'), now.label('now'))\
+        .join(Habit, Habit.id == days.c.habit_id).where(period <= now).distinct().cte('periods')
+
+    islands = db.select(
+        periods.c.habit_id,
+        periods.c.now,
+        periods.c.period,
+        (periods.c.period - db.func.row_number().over(
+            partition_by=periods.c.habit_id, order_by=periods.c.period)).label('island')
+    ).cte('islands')
+    runs = db.select(
+        islands.c.habit_id,
+        islands.c.now,
+        db.func.max(islands.c.period).label('last'),
+        db.func.count().label('length')
+    ).group_by(islands.c.habit_id, islands.c.now, islands.c.island).cte('runs')
+
+    # The current run ends at this period, or at the previous one while it can still be extended
+    totals = db.select(
+        runs.c.habit_id,
+        db.func.max(db.case((runs.c.last >= runs.c.now - 1, runs.c.length), else_=0)).label('current')
+    ).group_by(runs.c.habit_id).subquery('totals')
+    latest = db.select(days.c.habit_id, db.func.max(days.c.day).label('last_day'))\
+        .group_by(days.c.habit_id).subquery('latest')
+
+    stmt = db.select(latest.c.habit_id, totals.c.current, latest.c.last_day)\
+        .outerjoin(totals, totals.c.habit_id == latest.c.habit_id)
+    return {
+        habit_id: (current or 0, STREAK_EPOCH + timedelta(days=last_day))
+        for habit_id, current, last_day in db.session.execute(stmt)
+    }
+
+def update_habit_streaks(habits, today):
+    """Recompute the streak and last completion of ``habits`` and move their owners' leaderboard totals"""
+    previous = {habit.id: habit.streak or 0 for habit in habits}
+    if BITMAPS_ENABLED:
+        completed = load_completed_bitmaps([habit.id for habit in habits])
+        for habit in habits:
+            years = completed.get(habit.id, {})
+            habit.streak = bitmaps.current_streak(years, habit.habit_frequency.lower(), today)
+            habit.last_completed = bitmaps.last_set(years)
+    else:
+        streaks = habit_streaks([habit.id for habit in habits], today)
+        for habit in habits:
+            habit.streak, habit.last_completed = streaks.get(habit.id, (0, None))
+
+    for user_id in sorted({habit.user_id for habit in habits if habit.streak != previous[habit.id]}):
+        refresh_leaderboard(user_id)
+
+def update_habit_streak(habit, today):
+    """Recompute one habit's streak and last completion"""
+    update_habit_streaks([habit], today)
+    return habit.streak
+
+def refresh_habit_rollups(habit_id, user_id, since=None):
+    """Bring a habit's rollups up to date after its completions changed from ``since`` on.
+
+    While ROLLUPS_ENABLED is on, analytics read the rollups, so they are rebuilt
+    in the same transaction; otherwise the habit is only queued for the rollup
+    worker, which keeps the write path to a single statement.
+    """
+    if ROLLUPS_ENABLED:
+        rebuild_habit_rollups(habit_id, user_id, since)
+    else:
+        queue_habit_rollups(habit_id, user_id, since)
+
+def queue_habit_rollups(habit_id, user_id, since=None):
+    """Mark a habit's rollups stale from ``since`` (the whole history when None) for the rollup worker"""
+    insert = dialect_insert()
+    if insert is None:
+        entry = db.session.get(RollupQueue, habit_id)
+        if entry is None:
+            db.session.add(RollupQueue(habit_id=habit_id, user_id=user_id, since=since, version=1))
+            return
+        if entry.since is not None and (since is None or since < entry.since):
+            entry.since = since
+        entry.version += 1
+        return
+
+    stmt = insert(RollupQueue).values(habit_id=habit_id, user_id=user_id, since=since, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['habit_id'],
+        set_={
+            # The earlier of the two starting points, where NULL means the whole history
+            'since': db.case(
+                (db.or_(RollupQueue.since.is_(None), stmt.excluded.since.is_(None)), db.null()),
+                (stmt.excluded.since < RollupQueue.since, stmt.excluded.since),
+                else_=RollupQueue.since
+            ),
+            'version': RollupQueue.version + 1
+        }
+    )
+    db.session.execute(stmt)
+
+def rebuild_habit_rollups(habit_id, user_id, since=None):
+    """Rebuild a habit's rollups from the periods containing ``since`` onwards.
+
+    Without ``since`` the habit's whole history is rebuilt. Rows are upserted,
+    so two writers rebuilding the same habit at once cannot collide on the key.
+    """
+    earliest = None
+    if since is not None:
+        earliest = min(period_start(period_index(since, freq), freq) for freq in FREQUENCIES)
+    completions = [(day, completed) for _, day, completed in completion_history([habit_id], earliest)]
+
+    rows = []
+    for frequency in FREQUENCIES:
+        stale = HabitRollup.query.filter_by(habit_id=habit_id, period=frequency)
+        first = seed = None
+        if since is not None:
+            first = period_index(since, frequency)
+            stale = stale.filter(HabitRollup.period_start >= period_start(first, frequency))
+            previous = db.session.get(HabitRollup, (habit_id, frequency, period_start(first - 1, frequency)))
+            seed = previous.streak if previous else 0
+        stale.delete(synchronize_session=False)
+
+        for index, completed, not_completed, streak in period_rollups(completions, frequency, first, seed or 0):
+            rows.append({
+                'habit_id': habit_id,
+                'period': frequency,
+                'period_start': period_start(index, frequency),
+                'user_id': user_id,
+                'completed': completed,
+                'not_completed': not_completed,
+                'streak': streak
+            })
+
+    if not rows:
+        return
+    insert = dialect_insert()
+    if insert is None:
+        # No native upsert available, fall back to merge (read-then-write)
+        for row in rows:
+            db.session.merge(HabitRollup(**row))
+        db.session.flush()
+        return
+
+    stmt = insert(HabitRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['habit_id', 'period', 'period_start'],
+        set_={
+            'user_id': stmt.excluded.user_id,
+            'completed': stmt.excluded.completed,
+            'not_completed': stmt.excluded.not_completed,
+            'streak': stmt.excluded.streak
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def drain_rollup_queue(batch_size):
+    """Rebuild the rollups of queued habits, ``batch_size`` per transaction; returns how many were rebuilt"""
+    drained = 0
+    last_habit_id = 0
+    while True:
+        entries = db.session.query(RollupQueue.habit_id, RollupQueue.user_id, RollupQueue.since,
+                                   RollupQueue.version)\
+            .filter(RollupQueue.habit_id > last_habit_id)\
+            .order_by(RollupQueue.habit_id).limit(batch_size).all()
+        if not entries:
+            return drained
+
+        for habit_id, user_id, since, version in entries:
+            rebuild_habit_rollups(habit_id, user_id, since)
+            # A write that queued the habit again since it was read keeps its entry
+            RollupQueue.query.filter_by(habit_id=habit_id, version=version)\
+                .delete(synchronize_session=False)
+        db.session.commit()
+        drained += len(entries)
+        last_habit_id = entries[-1][0]
+
 # Home route
-@app.route('/')
+@bp.route('/')
 def home():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('index.html')
 
 # Signup route
-@app.route('/signup', methods=['GET', 'POST'])
+@bp.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            flash("We're handling a lot of sign-ups right now. Please try again in a moment.")
+            return render_template('signup.html'), 503, {'Retry-After': '1'}
 
         user = User(username=username, password=hashed_password)
         db.session.add(user)
+        db.session.flush()
+        db.session.add(LeaderboardEntry(user_id=user.id, total_streak=0))
         db.session.commit()
 
         flash("Account created successfully! Please log in.")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('signup.html')
 
 
 # Login route
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
         user = User.query.filter_by(username=username).first()
-        if user and bcrypt.check_password_hash(user.password, password):
+        try:
+            valid = user is not None and password_hasher.check(user.password, password)
+        except HasherBusy:
+            flash("We're handling a lot of logins right now. Please try again in a moment.")
+            return render_template('login.html'), 503, {'Retry-After': '1'}
+
+        if valid:
+            # Upgrade the stored hash when the configured work factor changed
+            if password_hasher.needs_rehash(user.password):
+                try:
+                    user.password = password_hasher.hash(password)
+                    db.session.commit()
+                except HasherBusy:
+                    pass  # Try again on a later login
+            user_cache.delete(user.id)
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid username or password')
     return render_template('login.html')
 
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     try:
-        # Fetch habits for the logged-in user
-        habits = Habit.query.filter_by(user_id=current_user.id).all()
-
-        # Refresh each habit object to ensure we get the latest data (e.g., streak values)
-        for habit in habits:
-            db.session.refresh(habit)  # Refresh the habit to get the latest streak
-
         now = datetime.now()  # Get the current datetime once
 
-       
+        # Fetch habits for the logged-in user together with today's completion
+        # and their categories in a single query. The session is scoped to this
+        # request, so everything loaded here is already current.
+        habits = db.session.query(
+            Habit,
+            db.func.coalesce(HabitCompletion.is_completed, False)
+        ).outerjoin(
+            HabitCompletion,
+            db.and_(
+                HabitCompletion.habit_id == Habit.id,
+                HabitCompletion.completion_date == now.date()
+            )
+        ).options(
+            db.joinedload(Habit.categories)
+        ).filter(
+            Habit.user_id == current_user.id
+        ).order_by(Habit.id).all()
 
         return render_template('dashboard.html', habits=habits, now=now) 
 
     except Exception as e:
-        app.logger.error(f"Error loading dashboard: {e}")
+        current_app.logger.error(f"Error loading dashboard: {e}")
         flash("An error occurred while loading the dashboard.")
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
+
+
 
 
+def build_analytics(user_id, today, days):
+    """Completion summary and chart series for a user's habits over the last ``days`` days"""
+    window_start = today - timedelta(days=days - 1)
 
+    # Initialize data structures for each frequency
+    habits_data = {
+        'daily': {},
+        'weekly': {},
+        'monthly': {}
+    }
+    completed_dates = {freq: {} for freq in habits_data}
 
-@app.route('/analytics')
+    # Query all habit completions in the window along with their habit
+    habit_completions = db.session.query(
+        Habit.habit_name,
+        Habit.habit_frequency,
+        HabitCompletion.completion_date,
+        HabitCompletion.is_completed
+    ).join(Habit, HabitCompletion.habit_id == Habit.id).filter(
+        HabitCompletion.user_id == user_id,
+        HabitCompletion.completion_date >= window_start
+    ).order_by(HabitCompletion.completion_date.desc()).all()
+
+    # Process completions by frequency
+    for habit_name, habit_frequency, date, is_completed in habit_completions:
+        frequency = habit_frequency.lower()
+
+        if habit_name not in habits_data[frequency]:
+            habits_data[frequency][habit_name] = {
+                'dates': [],
+                'completed': 0,
+                'not_completed': 0
+            }
+            completed_dates[frequency][habit_name] = []
+
+        habits_data[frequency][habit_name]['dates'].append(date.strftime('%Y-%m-%d'))
+
+        if is_completed:
+            habits_data[frequency][habit_name]['completed'] += 1
+            completed_dates[frequency][habit_name].append(date)
+        else:
+            habits_data[frequency][habit_name]['not_completed'] += 1
+
+    # Prepare chart data for each frequency (labels oldest to newest)
+    dates = date_labels(today, days)
+    chart_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+    streak_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+
+    # Calculate completion and streak data for each frequency
+    for frequency, habits in habits_data.items():
+        for habit_name in habits:
+            completion, streak = completion_series(
+                completed_dates[frequency][habit_name], frequency, today, days)
+            color = f'rgba({hash(habit_name) % 256}, {(hash(habit_name) * 2) % 256}, {(hash(habit_name) * 3) % 256}, 1)'
+
+            chart_data[frequency]['datasets'].append({
+                'label': habit_name,
+                'data': completion,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+            streak_data[frequency]['datasets'].append({
+                'label': f'{habit_name} Streak',
+                'data': streak,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+
+    return {
+        'habits_data': habits_data,
+        'chart_data': chart_data,
+        'streak_chart_data': streak_data
+    }
+
+def build_analytics_from_rollups(user_id, today, days):
+    """build_analytics() equivalent that reads habit_rollups instead of completions.
+
+    The window's daily rollups say which days were completed, so the series
+    go through completion_series() exactly as they do for the other sources;
+    streaks start at the window like everywhere else in the charts.
+    """
+    window_start = today - timedelta(days=days - 1)
+
+    habits_data = {
+        'daily': {},
+        'weekly': {},
+        'monthly': {}
+    }
+    completed_dates = {freq: {} for freq in habits_data}
+
+    rollups = db.session.query(
+        Habit.habit_name,
+        Habit.habit_frequency,
+        HabitRollup.period_start,
+        HabitRollup.completed,
+        HabitRollup.not_completed
+    ).join(Habit, HabitRollup.habit_id == Habit.id).filter(
+        HabitRollup.user_id == user_id,
+        HabitRollup.period == 'daily',
+        HabitRollup.period_start >= window_start
+    ).order_by(HabitRollup.period_start.desc()).all()
+
+    for habit_name, habit_frequency, day, completed, not_completed in rollups:
+        frequency = habit_frequency.lower()
+        summary = habits_data[frequency].setdefault(habit_name, {
+            'dates': [],
+            'completed': 0,
+            'not_completed': 0
+        })
+        summary['dates'].append(day.strftime('%Y-%m-%d'))
+        summary['completed'] += completed
+        summary['not_completed'] += not_completed
+        if completed:
+            completed_dates[frequency].setdefault(habit_name, []).append(day)
+
+    dates = date_labels(today, days)
+    chart_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+    streak_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+
+    for frequency, habits in habits_data.items():
+        for habit_name in habits:
+            completion, streak = completion_series(
+                completed_dates[frequency].get(habit_name, []), frequency, today, days)
+            color = f'rgba({hash(habit_name) % 256}, {(hash(habit_name) * 2) % 256}, {(hash(habit_name) * 3) % 256}, 1)'
+
+            chart_data[frequency]['datasets'].append({
+                'label': habit_name,
+                'data': completion,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+            streak_data[frequency]['datasets'].append({
+                'label': f'{habit_name} Streak',
+                'data': streak,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+
+    return {
+        'habits_data': habits_data,
+        'chart_data': chart_data,
+        'streak_chart_data': streak_data
+    }
+
+def analytics_builder():
+    if ROLLUPS_ENABLED:
+        return build_analytics_from_rollups
+    if BITMAPS_ENABLED:
+        return build_analytics_from_bitmaps
+    return build_analytics
+
+def build_analytics_from_bitmaps(user_id, today, days):
+    """build_analytics() equivalent that reads habit_completion_bitmaps instead of completions"""
+    window_start = today - timedelta(days=days - 1)
+    window_end = today + timedelta(days=1)
+
+    habits_data = {
+        'daily': {},
+        'weekly': {},
+        'monthly': {}
+    }
+    completed_dates = {freq: {} for freq in habits_data}
+
+    rows = db.session.query(
+        Habit.id,
+        Habit.habit_name,
+        Habit.habit_frequency,
+        CompletionBitmap.year,
+        CompletionBitmap.completed,
+        CompletionBitmap.missed
+    ).join(Habit, CompletionBitmap.habit_id == Habit.id).filter(
+        CompletionBitmap.user_id == user_id,
+        CompletionBitmap.year >= window_start.year,
+        CompletionBitmap.year <= today.year
+    ).order_by(Habit.id).all()
+
+    years = {}
+    for habit_id, habit_name, habit_frequency, year, completed, missed in rows:
+        completed_years, missed_years = years.setdefault((habit_id, habit_name, habit_frequency.lower()), ({}, {}))
+        completed_years[year] = bitmaps.decode(completed)
+        missed_years[year] = bitmaps.decode(missed)
+
+    # Counts are popcounts of the window; dates come off the set bits
+    for (habit_id, habit_name, frequency), (completed_years, missed_years) in years.items():
+        completed = bitmaps.window_mask(completed_years, window_start, window_end)
+        missed = bitmaps.window_mask(missed_years, window_start, window_end)
+        if not completed | missed:
+            continue
+        summary = habits_data[frequency].setdefault(habit_name, {
+            'dates': [],
+            'completed': 0,
+            'not_completed': 0
+        })
+        summary['dates'].extend(day.strftime('%Y-%m-%d')
+                                for day in reversed(bitmaps.mask_dates(completed | missed, window_start)))
+        summary['completed'] += bitmaps.popcount(completed)
+        summary['not_completed'] += bitmaps.popcount(missed)
+        completed_dates[frequency].setdefault(habit_name, []).extend(bitmaps.mask_dates(completed, window_start))
+
+    dates = date_labels(today, days)
+    chart_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+    streak_data = {freq: {'labels': dates, 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
+
+    for frequency, habits in habits_data.items():
+        for habit_name in habits:
+            completion, streak = completion_series(
+                completed_dates[frequency][habit_name], frequency, today, days)
+            color = f'rgba({hash(habit_name) % 256}, {(hash(habit_name) * 2) % 256}, {(hash(habit_name) * 3) % 256}, 1)'
+
+            chart_data[frequency]['datasets'].append({
+                'label': habit_name,
+                'data': completion,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+            streak_data[frequency]['datasets'].append({
+                'label': f'{habit_name} Streak',
+                'data': streak,
+                'borderColor': color,
+                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+                'fill': False
+            })
+
+    return {
+        'habits_data': habits_data,
+        'chart_data': chart_data,
+        'streak_chart_data': streak_data
+    }
+
+@bp.route('/analytics')
 @login_required
+@read_replica
 def analytics():
     try:
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        thirty_days_ago = thirty_days_ago.date()
-
-        # Initialize data structures for each frequency
-        habits_data = {
-            'daily': {},
-            'weekly': {},
-            'monthly': {}
-        }
-        
-        # Query all habit completions
-        habit_completions = HabitCompletion.query.join(Habit).filter(
-            HabitCompletion.user_id == current_user.id,
-            HabitCompletion.completion_date >= thirty_days_ago
-        ).order_by(HabitCompletion.completion_date.desc()).all()
-
-        # Process completions by frequency
-        for completion in habit_completions:
-            habit = completion.habit
-            frequency = habit.habit_frequency.lower()
-            habit_name = habit.habit_name
-            date = completion.completion_date
-            is_completed = completion.is_completed
-
-            if habit_name not in habits_data[frequency]:
-                habits_data[frequency][habit_name] = {
-                    'dates': [],
-                    'completed': 0,
-                    'not_completed': 0
-                }
-
-            habits_data[frequency][habit_name]['dates'].append(date.strftime('%Y-%m-%d'))
-            
-            if is_completed:
-                habits_data[frequency][habit_name]['completed'] += 1
-            else:
-                habits_data[frequency][habit_name]['not_completed'] += 1
-
-        # Prepare chart data for each frequency
-        chart_data = {freq: {'labels': [], 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
-        streak_data = {freq: {'labels': [], 'datasets': []} for freq in ['daily', 'weekly', 'monthly']}
-
-        # Generate date labels (oldest to newest)
-        dates = []
-        for i in range(30):
-            current_date = datetime.now() - timedelta(days=29-i)
-            dates.append(current_date.strftime('%Y-%m-%d'))
-
-        for freq in ['daily', 'weekly', 'monthly']:
-            chart_data[freq]['labels'] = dates
-            streak_data[freq]['labels'] = dates
-
-        # Calculate completion and streak data for each frequency
-        for frequency, habits in habits_data.items():
-            for habit_name, data in habits.items():
-                completion_dataset = {
-                    'label': habit_name,
-                    'data': [],
-                    'borderColor': f'rgba({hash(habit_name) % 256}, {(hash(habit_name) * 2) % 256}, {(hash(habit_name) * 3) % 256}, 1)',
-                    'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                    'fill': False
-                }
-                
-                streak_dataset = {
-                    'label': f'{habit_name} Streak',
-                    'data': [],
-                    'borderColor': f'rgba({hash(habit_name) % 256}, {(hash(habit_name) * 2) % 256}, {(hash(habit_name) * 3) % 256}, 1)',
-                    'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                    'fill': False
-                }
-
-                current_streak = 0
-                completed_dates = set(data['dates'])
-
-                if frequency == 'daily':
-                    for date in dates:
-                        if date in completed_dates:
-                            current_streak += 1
-                        else:
-                            current_streak = 0
-                        streak_dataset['data'].append(current_streak)
-                        completion_dataset['data'].append(1 if date in completed_dates else 0)
-
-                elif frequency == 'weekly':
-                    # Initialize variables for weekly tracking
-                    current_week = None
-                    week_completions = {}
-                    
-                    for date in dates:
-                        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-                        week_start = date_obj - timedelta(days=date_obj.weekday())
-                        week_end = week_start + timedelta(days=6)
-                        
-                        # Only process once per week
-                        if week_start not in week_completions:
-                            # Check if there's any completion in this week
-                            week_has_completion = any(
-                                week_start <= datetime.strptime(d, '%Y-%m-%d').date() <= week_end
-                                for d in completed_dates
-                            )
-                            week_completions[week_start] = week_has_completion
-                            
-                            if week_has_completion:
-                                if current_week is None or (week_start - current_week).days == 7:
-                                    current_streak += 1
-                                else:
-                                    current_streak = 1
-                            else:
-                                current_streak = 0
-                            
-                            current_week = week_start
-                        
-                        # For the graph, show the streak value only on the current date or last day of week
-                        if date_obj == datetime.now().date() or date_obj.weekday() == 6:
-                            streak_dataset['data'].append(current_streak)
-                        else:
-                            streak_dataset['data'].append(None)
-                        
-                        # Set completion status for the entire week
-                        completion_dataset['data'].append(1 if week_completions[week_start] else 0)
-
-                elif frequency == 'monthly':
-                    # Initialize variables for monthly tracking
-                    current_month = None
-                    month_completions = {}
-                    last_completed_month = None
-                    
-                    for date in dates:
-                        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-                        month_key = (date_obj.year, date_obj.month)
-                        
-                        # Only process once per month
-                        if month_key not in month_completions:
-                            # Check if there's any completion in this month
-                            month_has_completion = any(
-                                (datetime.strptime(d, '%Y-%m-%d').date().year,
-                                 datetime.strptime(d, '%Y-%m-%d').date().month) == month_key
-                                for d in completed_dates
-                            )
-                            month_completions[month_key] = month_has_completion
-                            
-                            if month_has_completion:
-                                if last_completed_month is None:
-                                    current_streak = 1
-                                elif (
-                                    month_key[0] * 12 + month_key[1] == 
-                                    last_completed_month[0] * 12 + last_completed_month[1] + 1
-                                ):
-                                    current_streak += 1
-                                else:
-                                    current_streak = 1
-                                last_completed_month = month_key
-                            else:
-                                current_streak = 0
-                        
-                        # For the graph, show the streak value only on the current date or last day of month
-                        is_last_day = date_obj.day == (date_obj.replace(day=1) + timedelta(days=32)).replace(day=1).day - 1
-                        if date_obj == datetime.now().date() or is_last_day:
-                            streak_dataset['data'].append(current_streak)
-                        else:
-                            streak_dataset['data'].append(None)
-                        
-                        # Set completion status for the entire month
-                        completion_dataset['data'].append(1 if month_completions[month_key] else 0)
-
-                chart_data[frequency]['datasets'].append(completion_dataset)
-                streak_data[frequency]['datasets'].append(streak_dataset)
+        days = request.args.get('days', 30, type=int)
+        if days not in ANALYTICS_WINDOWS:
+            days = ANALYTICS_WINDOWS[0]
+        today = datetime.now().date()
+
+        data = result_cache.fetch(
+            current_user.id, 'analytics',
+            lambda: analytics_builder()(current_user.id, today, days),
+            today, days
+        )
 
         return render_template('analytics.html', 
-                             habits_data=habits_data,
-                             chart_data=chart_data,
-                             streak_chart_data=streak_data)
+                             habits_data=data['habits_data'],
+                             chart_data=data['chart_data'],
+                             streak_chart_data=data['streak_chart_data'],
+                             days=days,
+                             windows=ANALYTICS_WINDOWS)
 
     except Exception as e:
-        app.logger.error(f"Error in analytics route: {e}")
+        current_app.logger.error(f"Error in analytics route: {e}")
         flash("An error occurred while loading the analytics.")
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
 
 
 
 # Logout route
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
+    user_cache.delete(current_user.id)
     logout_user()
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 # Adding a new habit
-@app.route('/add_habit', methods=['POST'])
+@bp.route('/add_habit', methods=['POST'])
 @login_required
 def add_habit():
     habit_name = request.json.get('habit_name')
     habit_frequency = request.json.get('habit_frequency')
     new_habit = Habit(user_id=current_user.id, habit_name=habit_name, habit_frequency=habit_frequency)
     db.session.add(new_habit)
+    new_achievements = check_achievements(
+        current_user.id, habit_count=Habit.query.filter_by(user_id=current_user.id).count())
     db.session.commit()
-    return jsonify({'message': 'Habit added successfully!'}), 200
+    result_cache.invalidate(current_user.id)
+    return jsonify({'message': 'Habit added successfully!', 'new_achievements': new_achievements}), 200
 
 # Display user's habits
-@app.route('/get_habits')
+@bp.route('/get_habits')
 @login_required
+@conditional_get()
 def get_habits():
-    habits = Habit.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': habit.id, 
-        'habit_name': habit.habit_name,
-        'habit_frequency': habit.habit_frequency,
-        'is_completed': habit.is_completed,
-        'streak': habit.streak
-    } for habit in habits])
-
-@app.route('/remove_habit/<int:habit_id>', methods=['DELETE'])
+    return jsonify(cached_habits(current_user.id))
+
+# The bodies of the JSON routes below are plain functions of the user so the
+# async tier (asgi.py) serves exactly the same data
+def cached_habits(user_id):
+    def load():
+        habits = Habit.query.filter_by(user_id=user_id).all()
+        return [{
+            'id': habit.id, 
+            'habit_name': habit.habit_name,
+            'habit_frequency': habit.habit_frequency,
+            'is_completed': habit.is_completed,
+            'streak': habit.streak
+        } for habit in habits]
+
+    return result_cache.fetch(user_id, 'get_habits', load)
+
+@bp.route('/remove_habit/<int:habit_id>', methods=['DELETE'])
 @login_required
 def remove_habit(habit_id):
     try:
@@ -400,15 +1346,21 @@ def remove_habit(habit_id):
             # Delete all notes associated with this habit
             HabitNote.query.filter_by(habit_id=habit_id, user_id=current_user.id).delete()
             
-            # Delete all habit completions for this habit
+            # Delete all habit completions and their rollups for this habit
             HabitCompletion.query.filter_by(habit_id=habit_id, user_id=current_user.id).delete()
+            CompletionArchive.query.filter_by(habit_id=habit_id).delete()
+            CompletionBitmap.query.filter_by(habit_id=habit_id).delete()
+            HabitRollup.query.filter_by(habit_id=habit_id).delete()
+            RollupQueue.query.filter_by(habit_id=habit_id).delete()
             
             # Delete any habit-category associations
             HabitCategory.query.filter_by(habit_id=habit_id).delete()
             
-            # Finally, delete the habit itself
+            # Finally, delete the habit itself and take its streak off the leaderboard total
             db.session.delete(habit)
+            refresh_leaderboard(current_user.id)
             db.session.commit()
+            result_cache.invalidate(current_user.id)
 
             return jsonify({"message": "Habit and all associated data removed successfully!"}), 200
         else:
@@ -416,142 +1368,262 @@ def remove_habit(habit_id):
 
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error removing habit: {e}")
+        current_app.logger.error(f"Error removing habit: {e}")
         return jsonify({"message": "An error occurred while removing the habit."}), 500
 
 
 
-@app.route('/update_habit_completion/<int:habit_id>', methods=['PUT'])
+@bp.route('/update_habit_completion/<int:habit_id>', methods=['PUT'])
 @login_required
 def update_habit_completion(habit_id):
     try:
-        is_completed = request.json['is_completed']
-        current_date = datetime.now().date()
-
-        habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first()
-        if not habit:
+        result = record_completion(current_user.id, habit_id, request.json['is_completed'], datetime.now().date())
+        if result is None:
             return jsonify({'message': 'Habit not found'}), 404
 
-        completion = HabitCompletion.query.filter_by(
-            habit_id=habit_id, 
-            user_id=current_user.id, 
-            completion_date=current_date
-        ).first()
-
-        if not completion:
-            completion = HabitCompletion(
-                habit_id=habit_id,
-                user_id=current_user.id,
-                completion_date=current_date,
-                is_completed=is_completed
-            )
-            db.session.add(completion)
-        else:
-            completion.is_completed = is_completed
-
-        # Update streak based on frequency
-        if is_completed:
-            if habit.last_completed:
-                days_since_last = (current_date - habit.last_completed).days
-                
-                if habit.habit_frequency.lower() == 'daily':
-                    if days_since_last == 1:
-                        habit.streak += 1
-                    elif days_since_last > 1:
-                        habit.streak = 1
-                elif habit.habit_frequency.lower() == 'weekly':
-                    last_week = habit.last_completed.isocalendar()[1]
-                    current_week = current_date.isocalendar()[1]
-                    if current_week - last_week == 1:
-                        habit.streak += 1
-                    elif current_week - last_week > 1:
-                        habit.streak = 1
-                elif habit.habit_frequency.lower() == 'monthly':
-                    last_month = habit.last_completed.month
-                    current_month = current_date.month
-                    months_diff = (current_date.year - habit.last_completed.year) * 12 + current_month - last_month
-                    if months_diff == 1:
-                        habit.streak += 1
-                    elif months_diff > 1:
-                        habit.streak = 1
-            else:
-                habit.streak = 1
-            
-            habit.last_completed = current_date
-
-        # Check for new achievements BEFORE committing
-        new_achievements = check_achievements(current_user.id, habit_id)
-        
         # Commit all changes in one transaction
         db.session.commit()
-        
-        return jsonify({
-            'message': 'Habit completion status updated successfully!',
-            'streak': habit.streak,
-            'new_achievements': new_achievements
-        })
+        result_cache.invalidate(current_user.id)
+        return jsonify(result)
 
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error updating habit completion: {e}")
+        current_app.logger.error(f"Error updating habit completion: {e}")
         return jsonify({'message': 'An error occurred while updating habit completion'}), 500
 
-@app.route('/habits_on_date/<date>')
+def record_completion(user_id, habit_id, is_completed, current_date):
+    """Record today's completion of a habit and everything derived from it.
+
+    Returns the response body, or None when the user has no such habit. The
+    caller commits.
+    """
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id).first()
+    if not habit:
+        return None
+
+    rows = [{
+        'habit_id': habit_id,
+        'user_id': user_id,
+        'completion_date': current_date,
+        'is_completed': bool(is_completed)
+    }]
+    upsert_completions(rows)
+
+    # Recompute the streak from the habit's completion history
+    apply_completion_bitmaps(rows)
+    update_habit_streak(habit, current_date)
+    refresh_habit_rollups(habit.id, habit.user_id, current_date)
+
+    # Check for new achievements BEFORE committing
+    new_achievements = check_achievements(user_id, habits=[habit])
+
+    return {
+        'message': 'Habit completion status updated successfully!',
+        'streak': habit.streak,
+        'new_achievements': new_achievements
+    }
+
+@bp.route('/habits_on_date/<date>')
 @login_required
 def habits_on_date(date):
     try:
         # Convert string date to datetime object
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-        
-        # Query all habits and their completion status for the given date
-        habits_query = db.session.query(
-            Habit,
-            HabitCompletion
-        ).outerjoin(
-            HabitCompletion,
-            db.and_(
-                HabitCompletion.habit_id == Habit.id,
-                HabitCompletion.completion_date == date_obj
-            )
-        ).filter(
-            Habit.user_id == current_user.id
-        ).all()
+        return jsonify(habits_on_date_data(current_user.id, date_obj, datetime.now().date()))
 
-        habits_data = []
-        for habit, completion in habits_query:
-            habits_data.append({
-                'habit_id': habit.id,
-                'habit_name': habit.habit_name,
-                'is_completed': completion.is_completed if completion else False
+    except Exception as e:
+        current_app.logger.error(f"Error fetching habits for date {date}: {e}")
+        return jsonify({'error': 'Failed to fetch habits'}), 500
+
+def habits_on_date_data(user_id, date_obj, today):
+    """Each of the user's habits with whether it was completed on ``date_obj``"""
+    if BITMAPS_ENABLED:
+        # One bitmap row per habit for the year; the day is a single bit test
+        rows = db.session.query(Habit.id, Habit.habit_name, CompletionBitmap.completed).outerjoin(
+            CompletionBitmap,
+            db.and_(CompletionBitmap.habit_id == Habit.id, CompletionBitmap.year == date_obj.year)
+        ).filter(Habit.user_id == user_id).all()
+        return [{
+            'habit_id': habit_id,
+            'habit_name': habit_name,
+            'is_completed': bitmaps.is_set({date_obj.year: bitmaps.decode(completed)}, date_obj)
+        } for habit_id, habit_name, completed in rows]
+
+    # Query all habits and their completion status for the given date
+    habits_query = db.session.query(
+        Habit,
+        HabitCompletion
+    ).outerjoin(
+        HabitCompletion,
+        db.and_(
+            HabitCompletion.habit_id == Habit.id,
+            HabitCompletion.completion_date == date_obj
+        )
+    ).filter(
+        Habit.user_id == user_id
+    ).all()
+
+    archived = None
+    if date_obj < archive_horizon(today):
+        # The day may have been compacted; read it through the merged history
+        archived = {habit_id: completed for habit_id, _, completed in completion_history(
+            [habit.id for habit, _ in habits_query], date_obj, date_obj + timedelta(days=1))}
+
+    habits_data = []
+    for habit, completion in habits_query:
+        if archived is not None:
+            is_completed = archived.get(habit.id, False)
+        else:
+            is_completed = completion.is_completed if completion else False
+        habits_data.append({
+            'habit_id': habit.id,
+            'habit_name': habit.habit_name,
+            'is_completed': is_completed
+        })
+
+    return habits_data
+
+# Completion matrix for a calendar window: one bitstring per habit where
+# character i is '1' if the habit was completed on start + i days.
+# ``end`` is exclusive, matching FullCalendar's event source ranges.
+@bp.route('/habits_in_range')
+@login_required
+@read_replica
+def habits_in_range():
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    days = (end - start).days
+    if days <= 0 or days > CALENDAR_MAX_RANGE_DAYS:
+        return jsonify({'error': f'Range must cover 1 to {CALENDAR_MAX_RANGE_DAYS} days'}), 400
+
+    try:
+        if BITMAPS_ENABLED:
+            rows = db.session.query(
+                Habit.id, Habit.habit_name, Habit.habit_frequency, CompletionBitmap.year, CompletionBitmap.completed
+            ).outerjoin(
+                CompletionBitmap,
+                db.and_(
+                    CompletionBitmap.habit_id == Habit.id,
+                    CompletionBitmap.year >= start.year,
+                    CompletionBitmap.year <= (end - timedelta(days=1)).year
+                )
+            ).filter(Habit.user_id == current_user.id).order_by(Habit.id).all()
+
+            habits = {}
+            for habit_id, habit_name, habit_frequency, year, completed in rows:
+                habit = habits.setdefault(habit_id, {
+                    'habit_id': habit_id,
+                    'habit_name': habit_name,
+                    'habit_frequency': habit_frequency,
+                    'years': {}
+                })
+                if year is not None:
+                    habit['years'][year] = bitmaps.decode(completed)
+            for habit in habits.values():
+                habit['completed'] = bitmaps.bitstring(bitmaps.window_mask(habit.pop('years'), start, end), days)
+
+            return jsonify({
+                'start': start.strftime('%Y-%m-%d'),
+                'end': end.strftime('%Y-%m-%d'),
+                'habits': list(habits.values())
             })
 
-        return jsonify(habits_data)
+        if start >= archive_horizon(datetime.now().date()):
+            rows = db.session.query(
+                Habit.id,
+                Habit.habit_name,
+                Habit.habit_frequency,
+                HabitCompletion.completion_date
+            ).outerjoin(
+                HabitCompletion,
+                db.and_(
+                    HabitCompletion.habit_id == Habit.id,
+                    HabitCompletion.completion_date >= start,
+                    HabitCompletion.completion_date < end,
+                    HabitCompletion.is_completed.is_(True)
+                )
+            ).filter(
+                Habit.user_id == current_user.id
+            ).order_by(Habit.id).all()
+        else:
+            # The window reaches back to days that may be archived; read the merged history
+            habit_rows = db.session.query(Habit.id, Habit.habit_name, Habit.habit_frequency)\
+                .filter(Habit.user_id == current_user.id).order_by(Habit.id).all()
+            names = {habit_id: (habit_name, habit_frequency) for habit_id, habit_name, habit_frequency in habit_rows}
+            rows = [tuple(habit) + (None,) for habit in habit_rows] + [
+                (habit_id,) + names[habit_id] + (day,)
+                for habit_id, day, _ in completion_history(list(names), start, end, completed_only=True)
+            ]
+
+        habits = {}
+        for habit_id, habit_name, habit_frequency, completion_date in rows:
+            if habit_id not in habits:
+                habits[habit_id] = {
+                    'habit_id': habit_id,
+                    'habit_name': habit_name,
+                    'habit_frequency': habit_frequency,
+                    'completed': bytearray(b'0' * days)
+                }
+            if completion_date:
+                habits[habit_id]['completed'][(completion_date - start).days] = ord('1')
+
+        for habit in habits.values():
+            habit['completed'] = habit['completed'].decode()
+
+        return jsonify({
+            'start': start.strftime('%Y-%m-%d'),
+            'end': end.strftime('%Y-%m-%d'),
+            'habits': list(habits.values())
+        })
 
     except Exception as e:
-        app.logger.error(f"Error fetching habits for date {date}: {e}")
+        current_app.logger.error(f"Error fetching habits from {start} to {end}: {e}")
         return jsonify({'error': 'Failed to fetch habits'}), 500
-        
+
 # Calendar route (needed for the link in dashboard.html)
-@app.route('/calendar')
+@bp.route('/calendar')
 @login_required
+@read_replica
 def calendar():
     return render_template('calendar.html')
 
-@app.route('/leaderboard')
+@bp.route('/leaderboard')
 @login_required
+@read_replica
 def leaderboard():
-    # Query to calculate total streaks for all users, including those with no streaks
-    leaderboard_data = db.session.query(
-        User.username,
-        db.func.coalesce(db.func.sum(Habit.streak), 0).label('total_streak')
-    ).outerjoin(Habit, User.id == Habit.user_id)\
-     .group_by(User.username)\
-     .order_by(db.desc('total_streak')).all()
+    page = max(request.args.get('page', 1, type=int), 1)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
 
-    return render_template('leaderboard.html', leaderboard=leaderboard_data)
+    # Top-K page straight off the (total_streak, user_id) index
+    rows = db.session.query(
+        User.username,
+        LeaderboardEntry.total_streak
+    ).join(User, User.id == LeaderboardEntry.user_id)\
+     .order_by(LeaderboardEntry.total_streak.desc(), LeaderboardEntry.user_id)\
+     .offset(offset).limit(LEADERBOARD_PAGE_SIZE + 1).all()
+
+    has_next = len(rows) > LEADERBOARD_PAGE_SIZE
+    leaderboard_data = rows[:LEADERBOARD_PAGE_SIZE]
+
+    # Current user's rank is one more than the number of users ahead of them
+    entry = db.session.get(LeaderboardEntry, current_user.id)
+    user_total = entry.total_streak if entry else 0
+    user_rank = LeaderboardEntry.query.filter(LeaderboardEntry.total_streak > user_total).count() + 1
+
+    return render_template('leaderboard.html',
+                           leaderboard=leaderboard_data,
+                           page=page,
+                           offset=offset,
+                           has_next=has_next,
+                           user_rank=user_rank,
+                           user_total=user_total)
 
 # Update habit completion for a specific date
-@app.route('/update_habit_status', methods=['POST'])
+@bp.route('/update_habit_status', methods=['POST'])
 @login_required
 def update_habit_status():
     data = request.get_json()
@@ -560,80 +1632,184 @@ def update_habit_status():
     is_completed = data.get("is_completed")
 
     completion_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    completion = HabitCompletion.query.filter_by(habit_id=habit_id, user_id=current_user.id, completion_date=completion_date).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first()
+    if not habit:
+        return jsonify({'message': 'Habit not found'}), 404
+
+    rows = [{
+        'habit_id': habit_id,
+        'user_id': current_user.id,
+        'completion_date': completion_date,
+        'is_completed': bool(is_completed)
+    }]
+    upsert_completions(rows)
+    apply_completion_bitmaps(rows)
+    refresh_habit_rollups(habit_id, current_user.id, completion_date)
+    # Backdated edits can extend or break the current streak too
+    update_habit_streak(habit, datetime.now().date())
+    new_achievements = check_achievements(current_user.id, habits=[habit])
+    db.session.commit()
+    result_cache.invalidate(current_user.id)
+    return jsonify({
+        'message': 'Habit status updated successfully!',
+        'streak': habit.streak,
+        'new_achievements': new_achievements
+    })
+
+# Update many habit/date completions in one transaction
+@bp.route('/update_habit_status/bulk', methods=['POST'])
+@login_required
+def bulk_update_habit_status():
+    entries = (request.get_json(silent=True) or {}).get('entries')
+    if not entries or not isinstance(entries, list):
+        return jsonify({'message': 'No entries provided.'}), 400
+    if len(entries) > BULK_UPDATE_MAX_ENTRIES:
+        return jsonify({'message': f'At most {BULK_UPDATE_MAX_ENTRIES} entries can be updated at once.'}), 400
+
+    # Later entries for the same habit and date win
+    rows = {}
+    try:
+        for entry in entries:
+            habit_id = int(entry['habit_id'])
+            completion_date = datetime.strptime(entry['completion_date'], "%Y-%m-%d").date()
+            rows[(habit_id, completion_date)] = {
+                'habit_id': habit_id,
+                'user_id': current_user.id,
+                'completion_date': completion_date,
+                'is_completed': bool(entry.get('is_completed'))
+            }
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'Each entry needs a habit_id and a YYYY-MM-DD completion_date.'}), 400
 
-    if completion:
-        completion.is_completed = is_completed
-    else:
-        completion = HabitCompletion(
-            habit_id=habit_id,
-            user_id=current_user.id,
-            completion_date=completion_date,
-            is_completed=is_completed
-        )
-        db.session.add(completion)
+    try:
+        # Validate ownership of every habit in one query
+        habit_ids = {habit_id for habit_id, _ in rows}
+        habits = Habit.query.filter(Habit.id.in_(habit_ids), Habit.user_id == current_user.id).all()
+        missing = habit_ids - {habit.id for habit in habits}
+        if missing:
+            return jsonify({'message': 'Habit not found', 'habit_ids': sorted(missing)}), 404
+
+        upsert_completions(list(rows.values()))
+        apply_completion_bitmaps(list(rows.values()))
+
+        # Recompute streaks and rollups once per habit, from its earliest edited date
+        today = datetime.now().date()
+        for habit in habits:
+            dates = [completion_date for habit_id, completion_date in rows if habit_id == habit.id]
+            refresh_habit_rollups(habit.id, current_user.id, min(dates))
+        update_habit_streaks(habits, today)
 
-    db.session.commit()
-    return jsonify({'message': 'Habit status updated successfully!'})
+        new_achievements = check_achievements(current_user.id, habits=habits)
+
+        db.session.commit()
+        result_cache.invalidate(current_user.id)
 
+        return jsonify({
+            'message': f'{len(rows)} habit statuses updated successfully!',
+            'streaks': {habit.id: habit.streak for habit in habits},
+            'new_achievements': new_achievements
+        })
 
-@app.route('/notifications')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error bulk updating habit statuses: {e}")
+        return jsonify({'message': 'An error occurred while updating habit statuses'}), 500
+
+
+def build_notifications(user_id, today):
+    """Streak-break and completed-today notifications for a user"""
+    # One query: each habit with today's completion, if any
+    rows = db.session.query(Habit.habit_name, Habit.last_completed, HabitCompletion.id).outerjoin(
+        HabitCompletion,
+        (HabitCompletion.habit_id == Habit.id) &
+        (HabitCompletion.completion_date == today) &
+        HabitCompletion.is_completed.is_(True)
+    ).filter(Habit.user_id == user_id).order_by(Habit.id).all()
+
+    # Streak breaks first, then habits completed today
+    notifications = [
+        {"message": f"Streak broken for habit '{habit_name}'. Try to rebuild it!"}
+        for habit_name, last_completed, _ in rows
+        if last_completed is not None and last_completed < today - timedelta(days=1)
+    ]
+    notifications.extend(
+        {"message": f"Great job completing '{habit_name}' today!"}
+        for habit_name, _, completion_id in rows
+        if completion_id is not None
+    )
+    return notifications
+
+def cached_notifications(user_id, today):
+    return result_cache.fetch(user_id, 'notifications', lambda: build_notifications(user_id, today), today)
+
+def stream_notifications(user_id, today):
+    """Notifications for a stream poll; this worker's cache may have missed other workers' writes"""
+    if result_cache.shared:
+        return cached_notifications(user_id, today)
+    return build_notifications(user_id, today)
+
+def notifications_digest(notifications):
+    """Event id identifying a notification snapshot, sent back as Last-Event-ID on reconnect"""
+    return hashlib.sha1(json.dumps(notifications).encode('utf-8')).hexdigest()
+
+def notifications_delta(current, latest):
+    """(added, removed) notifications between two snapshots"""
+    messages = [n['message'] for n in current]
+    latest_messages = [n['message'] for n in latest]
+    added = [n for n in latest if n['message'] not in messages]
+    removed = [n for n in current if n['message'] not in latest_messages]
+    return added, removed
+
+def sse_event(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/notifications')
 @login_required
+@read_replica
+@conditional_get(extra=lambda: datetime.now().date())
 def notifications():
     try:
-        # Define notification logic
-        notifications = []
-
-        # Check for streak breaks
-        streak_breaks = Habit.query.filter(
-            Habit.user_id == current_user.id,
-            Habit.last_completed < (datetime.now().date() - timedelta(days=1))
-        ).all()
-
-        for habit in streak_breaks:
-            notifications.append({
-                "message": f"Streak broken for habit '{habit.habit_name}'. Try to rebuild it!"
-            })
-
-        # Add notifications for habits completed today
-        today_completions = HabitCompletion.query.filter_by(
-            user_id=current_user.id,
-            completion_date=datetime.now().date(),
-            is_completed=True
-        ).all()
-
-        for completion in today_completions:
-            notifications.append({
-                "message": f"Great job completing '{completion.habit.habit_name}' today!"
-            })
-
-        return jsonify(notifications), 200
+        today = datetime.now().date()
+        return jsonify(cached_notifications(current_user.id, today)), 200
 
     except Exception as e:
-        app.logger.error(f"Error fetching notifications: {e}")
+        current_app.logger.error(f"Error fetching notifications: {e}")
         return jsonify({"error": "Unable to fetch notifications."}), 500
 
+# Server-Sent Events stream of notification changes, served by the ASGI tier
+# only (asgi.notification_stream). On a threaded WSGI server every open stream
+# would hold a worker thread for as long as the page stays open, so this tier
+# answers 204, which tells EventSource not to reconnect; the page then polls
+# /notifications with ETags instead.
+@bp.route('/notifications/stream')
+@login_required
+def notification_stream():
+    return Response(status=204)
+
+
+# Suggested habits with unique IDs; the list is static, so its ETag is a content hash
+SUGGESTED_HABITS = [
+    {"id": 1, "habit_name": "Drink 8 glasses of water", "habit_frequency": "Daily"},
+    {"id": 2, "habit_name": "Meditate for 10 minutes", "habit_frequency": "Daily"},
+    {"id": 3, "habit_name": "Go for a 30-minute walk", "habit_frequency": "Daily"},
+    {"id": 4, "habit_name": "Read for 15 minutes", "habit_frequency": "Daily"},
+    {"id": 5, "habit_name": "Write in a journal", "habit_frequency": "Daily"},
+    {"id": 6, "habit_name": "Do a 5-minute workout", "habit_frequency": "Daily"},
+    {"id": 7, "habit_name": "Plan tomorrow's tasks", "habit_frequency": "Daily"},
+    {"id": 8, "habit_name": "Disconnect from screens 1 hour before bed", "habit_frequency": "Daily"}
+]
+SUGGESTIONS_ETAG = hashlib.sha1(json.dumps(SUGGESTED_HABITS, sort_keys=True).encode('utf-8')).hexdigest()
 
 # Suggestions endpoint
-@app.route('/suggestions', methods=['GET'])
+@bp.route('/suggestions', methods=['GET'])
 @login_required
+@conditional_get(etag_for=lambda: SUGGESTIONS_ETAG)
 def suggestions():
-    # Define a list of suggested habits with unique IDs
-    suggested_habits = [
-        {"id": 1, "habit_name": "Drink 8 glasses of water", "habit_frequency": "Daily"},
-        {"id": 2, "habit_name": "Meditate for 10 minutes", "habit_frequency": "Daily"},
-        {"id": 3, "habit_name": "Go for a 30-minute walk", "habit_frequency": "Daily"},
-        {"id": 4, "habit_name": "Read for 15 minutes", "habit_frequency": "Daily"},
-        {"id": 5, "habit_name": "Write in a journal", "habit_frequency": "Daily"},
-        {"id": 6, "habit_name": "Do a 5-minute workout", "habit_frequency": "Daily"},
-        {"id": 7, "habit_name": "Plan tomorrow's tasks", "habit_frequency": "Daily"},
-        {"id": 8, "habit_name": "Disconnect from screens 1 hour before bed", "habit_frequency": "Daily"}
-    ]
-    return jsonify(suggested_habits), 200
+    return jsonify(SUGGESTED_HABITS), 200
 
 
 # Add suggested habit to the user's habits
-@app.route('/add_suggestion/<habit_name>', methods=['POST'])
+@bp.route('/add_suggestion/<habit_name>', methods=['POST'])
 @login_required
 def add_suggestion(habit_name):
     habit_frequency = request.json.get('habit_frequency', 'Daily')  # Default to Daily if not provided
@@ -644,106 +1820,725 @@ def add_suggestion(habit_name):
 
     new_habit = Habit(user_id=current_user.id, habit_name=habit_name, habit_frequency=habit_frequency)
     db.session.add(new_habit)
+    new_achievements = check_achievements(
+        current_user.id, habit_count=Habit.query.filter_by(user_id=current_user.id).count())
     db.session.commit()
-    return jsonify({"message": f"Habit '{habit_name}' has been added to your list!"}), 200
+    result_cache.invalidate(current_user.id)
+    return jsonify({
+        "message": f"Habit '{habit_name}' has been added to your list!",
+        "new_achievements": new_achievements
+    }), 200
 
-@app.route('/categories', methods=['GET', 'POST'])
+@bp.route('/categories', methods=['GET', 'POST'])
 @login_required
+@conditional_get()
 def categories():
     if request.method == 'POST':
-        name = request.json.get('name')
-        color = request.json.get('color', '#007bff')
-        category = Category(name=name, color=color, user_id=current_user.id)
-        db.session.add(category)
-        db.session.commit()
-        return jsonify({'message': 'Category added successfully', 'id': category.id})
+        try:
+            category_id = add_category(current_user.id, request.json.get('name'), request.json.get('color', '#007bff'))
+            db.session.commit()
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error adding category: {e}")
+            return jsonify({'message': 'An error occurred while adding the category'}), 500
+        result_cache.invalidate(current_user.id)
+        return jsonify({'message': 'Category added successfully', 'id': category_id})
     
-    categories = Category.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{'id': c.id, 'name': c.name, 'color': c.color} for c in categories])
+    return jsonify(categories_data(current_user.id))
+
+def categories_data(user_id):
+    categories = Category.query.filter_by(user_id=user_id).all()
+    return [{'id': c.id, 'name': c.name, 'color': c.color} for c in categories]
+
+def add_category(user_id, name, color):
+    """Add a category and return its id; the caller commits. Raises ValueError without a name."""
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('A category name is required')
+    category = Category(name=name.strip(), color=color, user_id=user_id)
+    db.session.add(category)
+    db.session.flush()
+    return category.id
+
+def notes_page_size():
+    return max(1, min(request.args.get('limit', NOTES_PAGE_SIZE, type=int), NOTES_MAX_PAGE_SIZE))
+
+def note_to_dict(note):
+    return {
+        'id': note.id,
+        'habit_id': note.habit_id,
+        'note': note.note,
+        'date': note.date.strftime('%Y-%m-%d %H:%M')
+    }
+
+# Cursors are the (date, id) of the last note on the previous page
+def encode_note_cursor(note):
+    return f"{note.date.isoformat()}_{note.id}"
+
+def decode_note_cursor(cursor):
+    date, note_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(date), int(note_id)
 
-@app.route('/habit/<int:habit_id>/notes', methods=['GET', 'POST'])
+@bp.route('/habit/<int:habit_id>/notes', methods=['GET', 'POST'])
 @login_required
+@conditional_get()
 def habit_notes(habit_id):
     if request.method == 'POST':
         note_text = request.json.get('note')
         note = HabitNote(habit_id=habit_id, user_id=current_user.id, note=note_text)
         db.session.add(note)
         db.session.commit()
+        result_cache.invalidate(current_user.id)
         return jsonify({'message': 'Note added successfully'})
-    
-    notes = HabitNote.query.filter_by(habit_id=habit_id, user_id=current_user.id)\
-        .order_by(HabitNote.date.desc()).all()
-    return jsonify([{
-        'id': note.id,
-        'note': note.note,
-        'date': note.date.strftime('%Y-%m-%d %H:%M')
-    } for note in notes])
 
-@app.route('/achievements')
+    limit = notes_page_size()
+    query = HabitNote.query.filter_by(habit_id=habit_id, user_id=current_user.id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            date, note_id = decode_note_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        # Keyset condition: strictly after the cursor in (date, id) descending order
+        query = query.filter(db.tuple_(HabitNote.date, HabitNote.id) < (date, note_id))
+
+    # One extra row tells whether another page follows
+    notes = query.order_by(HabitNote.date.desc(), HabitNote.id.desc()).limit(limit + 1).all()
+    page = notes[:limit]
+    return jsonify({
+        'notes': [note_to_dict(note) for note in page],
+        'next_cursor': encode_note_cursor(page[-1]) if len(notes) > limit else None
+    })
+
+def search_notes(user_id, text, habit_id=None, limit=NOTES_PAGE_SIZE):
+    """The user's notes matching every word of ``text``, best matches first.
+
+    The last word is matched as a prefix, so results follow the query as it is typed.
+    """
+    query = HabitNote.query.filter(HabitNote.user_id == user_id)
+    if habit_id is not None:
+        query = query.filter(HabitNote.habit_id == habit_id)
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        # Only word characters reach to_tsquery(), so user input is never parsed as query syntax
+        words = re.findall(r'\w+', text)
+        if not words:
+            return []
+        # Same expression as ix_habit_notes_note_fts so the GIN index is used
+        vector = db.func.to_tsvector(NOTE_TEXT_SEARCH_CONFIG, HabitNote.note)
+        terms = db.func.to_tsquery(NOTE_TEXT_SEARCH_CONFIG, ' & '.join(words[:-1] + [words[-1] + ':*']))
+        query = query.filter(vector.bool_op('@@')(terms)).order_by(db.func.ts_rank(vector, terms).desc())
+    elif dialect == 'sqlite':
+        fts = db.table('habit_notes_fts', db.column('rowid'), db.column('rank'))
+        # Quote each word so user input is never parsed as FTS5 query syntax
+        terms = ' '.join('"' + word.replace('"', '""') + '"' for word in text.split()) + '*'
+        query = query.join(fts, fts.c.rowid == HabitNote.id)\
+            .filter(db.text('habit_notes_fts MATCH :terms').bindparams(terms=terms))\
+            .order_by(fts.c.rank)
+    else:
+        for word in text.split():
+            query = query.filter(HabitNote.note.ilike(f'%{word}%'))
+
+    return query.order_by(HabitNote.date.desc(), HabitNote.id.desc()).limit(limit).all()
+
+@bp.route('/notes/search')
 @login_required
+@conditional_get()
+def notes_search():
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'message': 'A search query is required'}), 400
+    notes = search_notes(current_user.id, text, request.args.get('habit_id', type=int), notes_page_size())
+    return jsonify({'notes': [note_to_dict(note) for note in notes]})
+
+@bp.route('/achievements')
+@login_required
+@conditional_get()
 def achievements():
-    user_achievements = Achievement.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'name': a.name,
-        'description': a.description,
-        'badge_icon': a.badge_icon,
-        'earned_date': a.earned_date.strftime('%Y-%m-%d')
-    } for a in user_achievements])
-
-def check_achievements(user_id, habit_id):
-    """Check and award achievements based on user's habit completion"""
+    return jsonify(cached_achievements(current_user.id))
+
+def cached_achievements(user_id):
+    def load():
+        user_achievements = Achievement.query.filter_by(user_id=user_id).all()
+        return [{
+            'name': a.name,
+            'description': a.description,
+            'badge_icon': a.badge_icon,
+            'earned_date': a.earned_date.strftime('%Y-%m-%d')
+        } for a in user_achievements]
+
+    return result_cache.fetch(user_id, 'achievements', load)
+
+# Prometheus scrape endpoint
+@bp.route('/metrics')
+def prometheus_metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    stats = result_cache.stats()
+    body = metrics.render() + (
+        '# HELP habit_tracker_cache_hits_total Result cache hits.\n'
+        '# TYPE habit_tracker_cache_hits_total counter\n'
+        f'habit_tracker_cache_hits_total {stats["hits"]}\n'
+        '# HELP habit_tracker_cache_misses_total Result cache misses.\n'
+        '# TYPE habit_tracker_cache_misses_total counter\n'
+        f'habit_tracker_cache_misses_total {stats["misses"]}\n'
+    )
+    if stats['entries'] is not None:
+        body += ('# HELP habit_tracker_cache_entries Entries held by the in-process result cache.\n'
+                 '# TYPE habit_tracker_cache_entries gauge\n'
+                 f'habit_tracker_cache_entries {stats["entries"]}\n')
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+# Built assets, answered with a precompressed variant when the client accepts it
+@bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    served = filename
+    encoding = None
+    for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if request.accept_encodings[name] and os.path.isfile(os.path.join(ASSET_DIR, filename + suffix)):
+            served, encoding = filename + suffix, name
+            break
+
+    mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+    response = send_from_directory(ASSET_DIR, served, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+# Service worker caching the app shell. It is served from the root so its scope
+# covers every page, and is never cached itself so new builds are picked up
+@bp.route('/sw.js')
+def service_worker():
+    manifest = current_app.config['ASSET_MANIFEST']
+    shell = [url_for('main.serve_asset', filename=built) for built in sorted(manifest.values())]
+    body = render_template('sw.js', version=assets.manifest_version(manifest), shell=shell)
+    response = Response(body, mimetype='text/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/manifest.json')
+def web_manifest():
+    return send_from_directory(current_app.root_path, 'manifest.json', mimetype='application/manifest+json', max_age=3600)
+
+def check_achievements(user_id, habits=(), habit_count=None):
+    """Award achievements whose rules watch the metrics this change affected.
+
+    ``habits`` are the habits whose streaks just changed and ``habit_count`` is
+    passed when habits were added. New awards are added to the session; the
+    caller commits them with the rest of its changes.
+    """
     try:
-        # Get all habits for the user
-        habits = Habit.query.filter_by(user_id=user_id).all()
-        total_streak = sum(habit.streak for habit in habits)
-        
-        # Achievement criteria
-        achievements = []
-        
-        # First Habit Achievement
-        if len(habits) == 1:
-            achievements.append({
-                'name': 'Habit Pioneer',
-                'description': 'Created your first habit!',
-                'badge_icon': 'fa-star'
-            })
-        
-        # Streak Achievements
-        streak_achievements = [
-            (7, 'Week Warrior', 'Maintained a 7-day streak', 'fa-fire'),
-            (30, 'Monthly Master', 'Maintained a 30-day streak', 'fa-crown'),
-            (100, 'Habit Hero', 'Maintained a 100-day streak', 'fa-trophy')
-        ]
-        
-        for streak, name, desc, icon in streak_achievements:
-            if total_streak >= streak:
-                existing = Achievement.query.filter_by(
-                    user_id=user_id, name=name).first()
-                if not existing:
-                    achievements.append({
-                        'name': name,
-                        'description': desc,
-                        'badge_icon': icon
-                    })
-        
-        # Add new achievements to database
-        for achievement in achievements:
-            new_achievement = Achievement(
+        metrics = {}
+        if habit_count is not None:
+            metrics[achievement_rules.HABIT_COUNT] = habit_count
+        if habits:
+            metrics[achievement_rules.HABIT_STREAK] = max(habit.streak or 0 for habit in habits)
+            # The leaderboard entry already holds the user's running total
+            metrics[achievement_rules.TOTAL_STREAK] = db.session.query(LeaderboardEntry.total_streak)\
+                .filter_by(user_id=user_id).scalar() or 0
+        if not metrics:
+            return []
+
+        earned = {name for (name,) in db.session.query(Achievement.name).filter_by(user_id=user_id)}
+        awarded = achievement_rules.evaluate(metrics, earned)
+
+        for rule in awarded:
+            db.session.add(Achievement(
                 user_id=user_id,
-                name=achievement['name'],
-                description=achievement['description'],
-                badge_icon=achievement['badge_icon']
-            )
-            db.session.add(new_achievement)
-        
-        db.session.commit()
-        
-        return achievements
+                name=rule.name,
+                description=rule.description,
+                badge_icon=rule.badge_icon
+            ))
+
+        return [achievement_rules.to_dict(rule) for rule in awarded]
     except Exception as e:
-        app.logger.error(f"Error checking achievements: {e}")
+        current_app.logger.error(f"Error checking achievements: {e}")
         return []
 
-@app.route('/preferences')
+def dedupe_completions():
+    """Keep only the newest row per habit and day so the unique index can be built"""
+    result = db.session.execute(db.text(
+        'DELETE FROM habit_completions WHERE id NOT IN ('
+        'SELECT max(id) FROM habit_completions GROUP BY habit_id, completion_date)'
+    ))
+    click.echo(f"Removed {result.rowcount} duplicate habit completions")
+
+def rebuild_note_index():
+    """Index notes written before the FTS table existed"""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text("INSERT INTO habit_notes_fts(habit_notes_fts) VALUES ('rebuild')"))
+        click.echo("Note search index rebuilt")
+
+def backfill_leaderboard():
+    """Leaderboard entries for users created before the leaderboard table"""
+    rebuild_leaderboard_totals()
+    click.echo(f"Leaderboard rebuilt for {LeaderboardEntry.query.count()} users")
+
+# One-time data migrations run by upgrade-db, in order. A database records the
+# last one applied in schema_version, so each runs once per database; append
+# new steps to the end and never reorder them. Steps run before the indexes
+# are created, since those may depend on them.
+UPGRADE_STEPS = (
+    dedupe_completions,
+    rebuild_note_index,
+    backfill_leaderboard,
+)
+
+def stamp_schema_version(version):
+    entry = db.session.get(SchemaVersion, 1)
+    if entry is None:
+        entry = SchemaVersion(id=1)
+        db.session.add(entry)
+    entry.version = version
+    entry.updated_at = datetime.utcnow()
+
+@bp.cli.command('init-db')
+def init_db():
+    """Create the tables and indexes that do not exist yet"""
+    db.create_all()
+    # A new database has nothing to migrate
+    if db.session.get(SchemaVersion, 1) is None:
+        stamp_schema_version(len(UPGRADE_STEPS))
+        db.session.commit()
+    click.echo("Database schema created")
+
+@bp.cli.command('upgrade-db')
+def upgrade_db():
+    """Bring an existing database up to the current schema"""
+    db.create_all()
+    if db.engine.dialect.name == 'sqlite':
+        for statement in NOTE_FTS_DDL:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+
+    entry = db.session.get(SchemaVersion, 1)
+    applied = entry.version if entry else 0
+    for version, step in enumerate(UPGRADE_STEPS[applied:], start=applied + 1):
+        step()
+        stamp_schema_version(version)
+        db.session.commit()
+    if applied >= len(UPGRADE_STEPS):
+        click.echo(f"Data migrations are up to date (version {applied})")
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    click.echo("Indexes are up to date")
+
+@bp.cli.command('build-assets')
+def build_assets():
+    """Write fingerprinted, minified and precompressed assets to static/dist"""
+    manifest = assets.build(current_app.static_folder)
+    click.echo(f"Built {len(manifest)} assets into {os.path.join(current_app.static_folder, assets.DIST_DIR)}")
+
+@bp.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard():
+    """Recompute every leaderboard total from the habits table"""
+    rebuild_leaderboard_totals()
+    db.session.commit()
+    click.echo(f"Leaderboard rebuilt for {LeaderboardEntry.query.count()} users")
+
+@bp.cli.command('rollup-worker')
+@click.option('--batch-size', default=ROLLUP_BATCH_SIZE, show_default=True, help='Habits per transaction.')
+@click.option('--loop', is_flag=True, help='Keep draining the rollup queue instead of exiting once it is empty.')
+@click.option('--interval', default=300, show_default=True, help='Seconds to sleep between queue drains with --loop.')
+@click.option('--restart', is_flag=True, help='Start the backfill over from the first habit.')
+def rollup_worker(batch_size, loop, interval, restart):
+    """Backfill habit_rollups from habit_completions in batches, then rebuild queued habits"""
+    progress = db.session.get(RollupProgress, 1)
+    if not progress:
+        progress = RollupProgress(id=1, last_habit_id=0)
+        db.session.add(progress)
+    if restart:
+        progress.last_habit_id = 0
+    db.session.commit()
+
+    while True:
+        habits = db.session.query(Habit.id, Habit.user_id)\
+            .filter(Habit.id > progress.last_habit_id)\
+            .order_by(Habit.id).limit(batch_size).all()
+        if not habits:
+            break
+
+        for habit_id, user_id in habits:
+            rebuild_habit_rollups(habit_id, user_id)
+        progress.last_habit_id = habits[-1][0]
+        progress.updated_at = datetime.utcnow()
+        db.session.commit()
+        click.echo(f"Rolled up {len(habits)} habits through habit {progress.last_habit_id}")
+
+    # Habits created after the backfill passed them, or written since, are in the queue
+    while True:
+        drained = drain_rollup_queue(batch_size)
+        if drained:
+            click.echo(f"Rebuilt rollups of {drained} queued habits")
+        click.echo("Rollups are up to date")
+        if not loop:
+            break
+        time.sleep(interval)
+
+@bp.cli.command('build-completion-bitmaps')
+@click.option('--batch-size', default=ROLLUP_BATCH_SIZE, show_default=True, help='Habits per transaction.')
+def build_completion_bitmaps(batch_size):
+    """Build habit_completion_bitmaps from existing completions; run before setting BITMAPS_ENABLED=1"""
+    last_habit_id = 0
+    built = 0
+    while True:
+        habits = db.session.query(Habit.id, Habit.user_id)\
+            .filter(Habit.id > last_habit_id)\
+            .order_by(Habit.id).limit(batch_size).all()
+        if not habits:
+            break
+        owners = dict(habits)
+
+        by_year = {}
+        for habit_id, day, completed in completion_history(list(owners)):
+            by_year.setdefault((habit_id, day.year), []).append((day, completed))
+
+        CompletionBitmap.query.filter(CompletionBitmap.habit_id.in_(owners)).delete(synchronize_session=False)
+        for (habit_id, year), completions in by_year.items():
+            completed, missed = bitmaps.year_masks(completions)
+            db.session.add(CompletionBitmap(habit_id=habit_id, year=year, user_id=owners[habit_id],
+                                            completed=bitmaps.encode(completed), missed=bitmaps.encode(missed)))
+        built += len(by_year)
+        last_habit_id = habits[-1][0]
+        db.session.commit()
+        click.echo(f"Built bitmaps through habit {last_habit_id}")
+
+    click.echo(f"Built {built} habit-year bitmaps")
+
+# Run daily (cron or a scheduler); it is safe to re-run at any time
+@bp.cli.command('compact-completions')
+@click.option('--batch-size', default=ROLLUP_BATCH_SIZE, show_default=True, help='Habits per transaction.')
+def compact_completions(batch_size):
+    """Move completions older than the hot horizon into habit_completion_archive"""
+    horizon = completion_horizon(datetime.now().date())
+    last_habit_id = 0
+    moved = 0
+
+    while True:
+        habits = db.session.query(Habit.id, Habit.user_id)\
+            .filter(Habit.id > last_habit_id)\
+            .order_by(Habit.id).limit(batch_size).all()
+        if not habits:
+            break
+        owners = dict(habits)
+        old = HabitCompletion.query.filter(
+            HabitCompletion.habit_id.in_(owners),
+            HabitCompletion.completion_date < horizon
+        )
+
+        months = {}
+        for habit_id, day, completed in old.with_entities(
+                HabitCompletion.habit_id, HabitCompletion.completion_date, HabitCompletion.is_completed):
+            months.setdefault((habit_id, day.replace(day=1)), []).append((day, completed))
+            moved += 1
+
+        if months:
+            archived = {
+                (entry.habit_id, entry.month): entry
+                for entry in CompletionArchive.query.filter(
+                    CompletionArchive.habit_id.in_({habit_id for habit_id, _ in months}),
+                    CompletionArchive.month < horizon
+                )
+            }
+            for (habit_id, month), completions in months.items():
+                masks = pack_month(completions)
+                entry = archived.get((habit_id, month))
+                if entry:
+                    # Late writes to an archived month override the archived days
+                    entry.completed_days, entry.missed_days = merge_month(
+                        (entry.completed_days, entry.missed_days), masks)
+                else:
+                    db.session.add(CompletionArchive(habit_id=habit_id, month=month, user_id=owners[habit_id],
+                                                     completed_days=masks[0], missed_days=masks[1]))
+            old.delete(synchronize_session=False)
+
+        last_habit_id = habits[-1][0]
+        db.session.commit()
+
+    click.echo(f"Archived {moved} completions older than {horizon}")
+
+def archived_export_rows(user_id=None, start=None, end=None):
+    """Archived completions in the completions export layout; archived rows have no id"""
+    query = CompletionArchive.query.order_by(CompletionArchive.habit_id, CompletionArchive.month)
+    if user_id is not None:
+        query = query.filter(CompletionArchive.user_id == user_id)
+    if start is not None:
+        query = query.filter(CompletionArchive.month >= start.replace(day=1))
+    if end is not None:
+        query = query.filter(CompletionArchive.month <= end)
+    for entry in query.yield_per(EXPORT_CHUNK_SIZE):
+        for day, completed in unpack_month(entry.month, entry.completed_days, entry.missed_days):
+            if (start is None or day >= start) and (end is None or day <= end):
+                yield (None, entry.user_id, entry.habit_id, day, completed)
+
+def export_query(kind, user_id=None, start=None, end=None):
+    """Select for one kind of exported record, optionally limited to a user and date range"""
+    if kind == 'habits':
+        stmt = db.select(Habit.id, Habit.user_id, Habit.habit_name, Habit.habit_frequency,
+                         Habit.streak, Habit.last_completed).order_by(Habit.id)
+        owner, date_column = Habit.user_id, None
+    elif kind == 'completions':
+        stmt = db.select(HabitCompletion.id, HabitCompletion.user_id, HabitCompletion.habit_id,
+                         HabitCompletion.completion_date, HabitCompletion.is_completed).order_by(HabitCompletion.id)
+        owner, date_column = HabitCompletion.user_id, HabitCompletion.completion_date
+    elif kind == 'notes':
+        stmt = db.select(HabitNote.id, HabitNote.user_id, HabitNote.habit_id,
+                         HabitNote.date, HabitNote.note).order_by(HabitNote.id)
+        owner, date_column = HabitNote.user_id, HabitNote.date
+    else:
+        raise ValueError(f"Unknown export kind '{kind}'")
+
+    if user_id is not None:
+        stmt = stmt.where(owner == user_id)
+    if date_column is not None and start is not None:
+        stmt = stmt.where(date_column >= start)
+    if date_column is not None and end is not None:
+        # End date is inclusive, also for datetime columns
+        stmt = stmt.where(date_column < end + timedelta(days=1))
+    return stmt
+
+def stream_export(stmt, fmt, extra_rows=()):
+    """Yield an export chunk by chunk from a server-side cursor, followed by ``extra_rows``"""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    columns = list(result.keys())
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == 'csv':
+        writer.writerow(columns)
+
+    for rows in result.partitions():
+        for row in rows:
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=lambda value: value.isoformat()))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    for row in extra_rows:
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=lambda value: value.isoformat()))
+            buffer.write('\n')
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def parse_export_dates(start, end):
+    """Parse optional YYYY-MM-DD range bounds"""
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    return start, end
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Stream the current user's habits, completions or notes as CSV or NDJSON
+@bp.route('/export/<kind>.<fmt>')
+@login_required
+def export(kind, fmt):
+    if kind not in ('habits', 'completions', 'notes') or fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Unknown export'}), 404
+    try:
+        start, end = parse_export_dates(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    stmt = export_query(kind, current_user.id, start, end)
+    extra_rows = archived_export_rows(current_user.id, start, end) if kind == 'completions' else ()
+    return Response(
+        stream_with_context(stream_export(stmt, fmt, extra_rows)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'}
+    )
+
+@bp.cli.command('export-all')
+@click.argument('kind', type=click.Choice(['habits', 'completions', 'notes']))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_MIMETYPES)), default='csv', show_default=True)
+@click.option('--start', help='First date to include (YYYY-MM-DD).')
+@click.option('--end', help='Last date to include (YYYY-MM-DD).')
+@click.option('--output', default='-', help='File to write, stdout by default.')
+def export_all(kind, fmt, start, end, output):
+    """Stream every user's habits, completions or notes"""
+    start, end = parse_export_dates(start, end)
+    with click.open_file(output, 'w') as out:
+        extra_rows = archived_export_rows(None, start, end) if kind == 'completions' else ()
+        for chunk in stream_export(export_query(kind, None, start, end), fmt, extra_rows):
+            out.write(chunk)
+
+def read_import_rows(stream, fmt):
+    """Yield dict rows from a CSV or NDJSON text stream one at a time"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+def parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+def load_completions(rows):
+    """Bulk-load a batch of completion rows, skipping days that already exist"""
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # COPY into a scratch table, then merge it in with one INSERT ... SELECT
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow((row['habit_id'], row['user_id'], row['completion_date'].isoformat(),
+                             't' if row['is_completed'] else 'f'))
+        buffer.seek(0)
+
+        db.session.execute(db.text(
+            'CREATE TEMP TABLE IF NOT EXISTS import_completions '
+            '(habit_id integer, user_id integer, completion_date date, is_completed boolean) ON COMMIT DROP'
+        ))
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY import_completions FROM STDIN WITH (FORMAT csv)', buffer)
+        db.session.execute(db.text(
+            'INSERT INTO habit_completions (habit_id, user_id, completion_date, is_completed) '
+            'SELECT habit_id, user_id, completion_date, is_completed FROM import_completions '
+            'ON CONFLICT (habit_id, completion_date) DO NOTHING'
+        ))
+        db.session.execute(db.text('TRUNCATE import_completions'))
+        return
+
+    insert = dialect_insert()
+    if insert is None:
+        for row in rows:
+            if not HabitCompletion.query.filter_by(
+                    habit_id=row['habit_id'], completion_date=row['completion_date']).first():
+                db.session.add(HabitCompletion(**row))
+        db.session.flush()
+        return
+
+    # executemany of a single prepared INSERT
+    stmt = insert(HabitCompletion).on_conflict_do_nothing(index_elements=['habit_id', 'completion_date'])
+    db.session.execute(stmt, rows)
+
+def import_history(user_id, rows):
+    """Import habits and completions for a user; the caller commits.
+
+    Each row needs a habit_name and may carry habit_frequency (daily, weekly or
+    monthly, in any case), completion_date (YYYY-MM-DD) and is_completed. Habits are matched by name and created when
+    missing. Completions are loaded in batches of IMPORT_BATCH_SIZE, and streaks
+    are recomputed once per imported habit at the end.
+    """
+    habits = {habit.habit_name: habit for habit in Habit.query.filter_by(user_id=user_id)}
+    touched = {}
+    years = {}
+    batch = []
+    count = 0
+
+    for count, row in enumerate(rows, start=1):
+        name = (row.get('habit_name') or '').strip()
+        if not name:
+            raise ValueError(f"Row {count} has no habit_name")
+        frequency = (row.get('habit_frequency') or 'daily').strip().lower()
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Row {count} has an unknown habit_frequency {row.get('habit_frequency')!r}")
+
+        habit = habits.get(name)
+        if habit is None:
+            # Stored capitalized, like the rest of the app ('Daily')
+            habit = Habit(user_id=user_id, habit_name=name, habit_frequency=frequency.capitalize())
+            db.session.add(habit)
+            db.session.flush()
+            habits[name] = habit
+        touched[habit.id] = habit
+
+        if row.get('completion_date'):
+            completion_date = datetime.strptime(row['completion_date'], '%Y-%m-%d').date()
+            years.setdefault(habit.id, set()).add(completion_date.year)
+            batch.append({
+                'habit_id': habit.id,
+                'user_id': user_id,
+                'completion_date': completion_date,
+                'is_completed': parse_bool(row.get('is_completed'))
+            })
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                load_completions(batch)
+                batch = []
+    load_completions(batch)
+
+    today = datetime.now().date()
+    for habit in touched.values():
+        refresh_completion_bitmaps(habit.id, user_id, years.get(habit.id, ()))
+        refresh_habit_rollups(habit.id, user_id)
+    update_habit_streaks(list(touched.values()), today)
+    check_achievements(user_id, habits=list(touched.values()), habit_count=len(habits))
+
+    return {'rows': count, 'habits': len(touched)}
+
+# Import habit and completion history from a CSV or NDJSON upload
+@bp.route('/import', methods=['POST'])
+@login_required
+def import_habits():
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'message': 'No file uploaded.'}), 400
+    fmt = request.form.get('format') or upload.filename.rsplit('.', 1)[-1].lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': 'Format must be csv or ndjson.'}), 400
+
+    try:
+        # utf-8-sig drops the BOM spreadsheet exports start with; newline='' as the csv module requires
+        stream = TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        summary = import_history(current_user.id, read_import_rows(stream, fmt))
+        db.session.commit()
+        result_cache.invalidate(current_user.id)
+        return jsonify({'message': f"Imported {summary['rows']} rows.", **summary})
+
+    except (ValueError, KeyError) as e:
+        db.session.rollback()
+        return jsonify({'message': f'Invalid import file: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error importing history: {e}")
+        return jsonify({'message': 'An error occurred while importing history.'}), 500
+
+@bp.cli.command('import-history')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+def import_history_command(username, path, fmt):
+    """Import a CSV or NDJSON history file for USERNAME"""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"No user named '{username}'")
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        summary = import_history(user.id, read_import_rows(stream, fmt))
+    db.session.commit()
+    result_cache.invalidate(user.id)
+    click.echo(f"Imported {summary['rows']} rows into {summary['habits']} habits")
+
+@bp.route('/preferences')
 @login_required
 def preferences():
     try:
@@ -759,10 +2554,10 @@ def preferences():
     except SQLAlchemyError as e:
         logger.error(f"Error loading preferences page: {e}")
         flash("Unable to load preferences. Please try again.", "error")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
 
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,373 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from functools import wraps
+from urllib.parse import quote
+
+from a2wsgi import WSGIMiddleware
+from flask import g
+from itsdangerous import BadSignature
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as habit_app
+from app import db, result_cache
+
+# Asynchronous serving mode for the high-traffic JSON endpoints, and the
+# ProcFile's web process (uvicorn takes its worker count from WEB_CONCURRENCY):
+#
+#     uvicorn asgi:create_asgi_app --factory --workers 2
+#
+# The routes below run on an event loop over async SQLAlchemy (asyncpg on
+# PostgreSQL, aiosqlite on SQLite), so a slow client or an idle notification
+# stream costs a coroutine instead of a worker thread. Every other path falls
+# through to the Flask app, which runs on a thread pool in the same process.
+#
+# The endpoints share app.py's models and route bodies: each body runs through
+# AsyncSession.run_sync(), which points db.session at the async connection.
+# The queries still go through the async driver (SQLAlchemy bridges them with
+# greenlets), so waiting on the database never blocks the loop. Users are
+# authenticated from the Flask session cookie, so one login covers both tiers.
+# Reads are always served by the primary.
+
+# SQLAlchemy async drivers by sync driver name; ASYNC_DATABASE_URL overrides the mapping
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# Threads running the Flask routes that fall through; the password hashing
+# limit in app.py is derived from this
+WSGI_THREADS = habit_app.WSGI_THREADS
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Rendered byte for byte like Flask's jsonify() outside debug mode, so both tiers hash bodies alike"""
+
+    def render(self, content):
+        return (json.dumps(content, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def async_database_url(url):
+    """The async-driver equivalent of a sync engine URL"""
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+async def run_shared(request, session, fn, *args):
+    """Run one of app.py's sync route bodies on ``session``"""
+    flask_app = request.app.state.flask_app
+
+    statements = request.scope.get('state', {}).get('sql_statements')
+
+    def call(sync_session):
+        with flask_app.app_context():
+            if statements is not None:
+                # Picked up by app.record_statement() for RequestMetrics
+                g.sql_statements = statements
+            db.session.registry.set(sync_session)
+            try:
+                return fn(*args)
+            finally:
+                # Unregister before the context's teardown so it cannot close the session
+                db.session.registry.clear()
+
+    return await session.run_sync(call)
+
+
+class RequestMetrics:
+    """ASGI middleware feeding the async routes into the same /metrics series as Flask's.
+
+    Requests falling through to the Flask mount are skipped; Flask's own
+    after_request hook records those. Latency runs until the response starts,
+    so a notification stream counts its setup rather than the whole connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        statements = []
+        scope.setdefault('state', {})['sql_statements'] = statements
+        started = time.perf_counter()
+
+        async def send_and_record(message):
+            endpoint = scope.get('endpoint')
+            if message['type'] == 'http.response.start' and endpoint is not None \
+                    and not isinstance(endpoint, WSGIMiddleware):
+                flask_app = scope['app'].state.flask_app
+                habit_app.observe_request(f'main.{endpoint.__name__}', scope['method'], scope['path'],
+                                          message['status'], time.perf_counter() - started, statements,
+                                          flask_app.logger)
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+
+
+def session_cookie(request):
+    """The Flask session of the request, or {} when it is missing or forged"""
+    flask_app = request.app.state.flask_app
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def remember_write(request, response):
+    """Counterpart of app.remember_write: keep the user's next reads on the primary"""
+    if not habit_app.REPLICA_BINDS:
+        return
+    flask_app = request.app.state.flask_app
+    data = dict(request.state.session, last_write_at=time.time())
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    response.set_cookie(
+        flask_app.config['SESSION_COOKIE_NAME'], serializer.dumps(data),
+        path=flask_app.config['SESSION_COOKIE_PATH'] or '/',
+        domain=flask_app.config['SESSION_COOKIE_DOMAIN'] or None,
+        secure=flask_app.config['SESSION_COOKIE_SECURE'],
+        httponly=flask_app.config['SESSION_COOKIE_HTTPONLY'],
+        samesite=flask_app.config['SESSION_COOKIE_SAMESITE'] or None
+    )
+
+
+def login_required(view):
+    @wraps(view)
+    async def wrapper(request):
+        request.state.session = session_cookie(request)
+        user_id = request.state.session.get('_user_id')
+        user = None
+        if user_id is not None:
+            async with request.app.state.sessions() as session:
+                user = await run_shared(request, session, habit_app.load_user, user_id)
+        if user is None:
+            # Same answer as Flask-Login's login_view redirect
+            return RedirectResponse(f"/login?next={quote(request.url.path, safe='')}", status_code=302)
+        request.state.user_id = user.id
+        return await view(request)
+    return wrapper
+
+
+def full_path(request):
+    # Flask's request.full_path, so both tiers hand out the same ETags
+    return f"{request.url.path}?{request.url.query}"
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('if-none-match', '')
+    return f'"{etag}"' in if_none_match or if_none_match.strip() == '*'
+
+
+def conditional_get(extra=None):
+    """app.conditional_get() for async views"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            if request.method != 'GET':
+                return await view(request)
+            if not result_cache.shared:
+                # Hash of the body, as Flask's Response.add_etag() computes it
+                response = await view(request)
+                if response.status_code != 200:
+                    return response
+                etag = hashlib.sha1(response.body).hexdigest()
+                headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+                if etag_matches(request, etag):
+                    return Response(status_code=304, headers=headers)
+                response.headers.update(headers)
+                return response
+            user_id = request.state.user_id
+            etag = habit_app.user_etag(full_path(request), user_id, *([extra()] if extra is not None else []))
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+            response = await view(request)
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
+
+
+def today():
+    return datetime.now().date()
+
+
+@login_required
+@conditional_get()
+async def get_habits(request):
+    user_id = request.state.user_id
+    async with request.app.state.sessions() as session:
+        return JSONResponse(await run_shared(request, session, habit_app.cached_habits, user_id))
+
+
+@login_required
+async def habits_on_date(request):
+    date = request.path_params['date']
+    try:
+        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        async with request.app.state.sessions() as session:
+            return JSONResponse(await run_shared(
+                request, session, habit_app.habits_on_date_data, request.state.user_id, date_obj, today()))
+    except Exception as e:
+        request.app.state.flask_app.logger.error(f"Error fetching habits for date {date}: {e}")
+        return JSONResponse({'error': 'Failed to fetch habits'}, status_code=500)
+
+
+@login_required
+async def update_habit_completion(request):
+    user_id = request.state.user_id
+    async with request.app.state.sessions() as session:
+        try:
+            is_completed = (await request.json())['is_completed']
+            result = await run_shared(request, session, habit_app.record_completion,
+                                      user_id, request.path_params['habit_id'], is_completed, today())
+            if result is None:
+                return JSONResponse({'message': 'Habit not found'}, status_code=404)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            request.app.state.flask_app.logger.error(f"Error updating habit completion: {e}")
+            return JSONResponse({'message': 'An error occurred while updating habit completion'}, status_code=500)
+
+    result_cache.invalidate(user_id)
+    response = JSONResponse(result)
+    remember_write(request, response)
+    return response
+
+
+@login_required
+@conditional_get(extra=today)
+async def notifications(request):
+    try:
+        async with request.app.state.sessions() as session:
+            return JSONResponse(await run_shared(
+                request, session, habit_app.cached_notifications, request.state.user_id, today()))
+    except Exception as e:
+        request.app.state.flask_app.logger.error(f"Error fetching notifications: {e}")
+        return JSONResponse({"error": "Unable to fetch notifications."}, status_code=500)
+
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events stream of notification changes; the WSGI tier only answers 204.
+
+    The first event is a full snapshot unless Last-Event-ID shows the browser
+    already has it; after that a delta is sent only when the notifications
+    change, which polls detect from the user's cache version (plus a periodic
+    resync with a per-process cache). Connections are closed after
+    NOTIFICATION_STREAM_SECONDS and EventSource reconnects on its own. Idle
+    streams hold no thread or database connection.
+    """
+    user_id = request.state.user_id
+    last_event_id = request.headers.get('last-event-id')
+
+    async def load(day):
+        async with request.app.state.sessions() as session:
+            return await run_shared(request, session, habit_app.stream_notifications, user_id, day)
+
+    async def generate():
+        day = today()
+        version = result_cache.version_tag(user_id)
+        current = await load(day)
+        digest = habit_app.notifications_digest(current)
+        yield f"retry: {int(habit_app.NOTIFICATION_POLL_SECONDS * 1000)}\n\n"
+        if digest != last_event_id:
+            yield habit_app.sse_event('snapshot', current, digest)
+
+        started = last_write = last_load = time.monotonic()
+        while time.monotonic() - started < habit_app.NOTIFICATION_STREAM_SECONDS:
+            await asyncio.sleep(habit_app.NOTIFICATION_POLL_SECONDS)
+            # The version covers this process's writes; other workers' are only
+            # picked up by the coarse resync unless the cache is shared
+            resync = not result_cache.shared and \
+                time.monotonic() - last_load >= habit_app.NOTIFICATION_RESYNC_SECONDS
+            if resync or (result_cache.version_tag(user_id), today()) != (version, day):
+                day, version = today(), result_cache.version_tag(user_id)
+                latest = await load(day)
+                last_load = time.monotonic()
+                added, removed = habit_app.notifications_delta(current, latest)
+                current = latest
+                if added or removed:
+                    digest = habit_app.notifications_digest(current)
+                    yield habit_app.sse_event('delta', {'added': added, 'removed': removed}, digest)
+                    last_write = time.monotonic()
+                    continue
+            if time.monotonic() - last_write >= habit_app.NOTIFICATION_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@login_required
+@conditional_get()
+async def achievements(request):
+    async with request.app.state.sessions() as session:
+        return JSONResponse(await run_shared(request, session, habit_app.cached_achievements, request.state.user_id))
+
+
+@login_required
+@conditional_get()
+async def categories(request):
+    user_id = request.state.user_id
+    async with request.app.state.sessions() as session:
+        if request.method == 'POST':
+            try:
+                body = await request.json()
+                category_id = await run_shared(request, session, habit_app.add_category,
+                                               user_id, body.get('name'), body.get('color', '#007bff'))
+                await session.commit()
+            except ValueError as e:
+                await session.rollback()
+                return JSONResponse({'message': str(e)}, status_code=400)
+            except Exception as e:
+                await session.rollback()
+                request.app.state.flask_app.logger.error(f"Error adding category: {e}")
+                return JSONResponse({'message': 'An error occurred while adding the category'}, status_code=500)
+            result_cache.invalidate(user_id)
+            response = JSONResponse({'message': 'Category added successfully', 'id': category_id})
+            remember_write(request, response)
+            return response
+        return JSONResponse(await run_shared(request, session, habit_app.categories_data, user_id))
+
+
+def create_asgi_app(flask_app=None, database_url=None):
+    """ASGI application serving the async routes and handing the rest to Flask"""
+    flask_app = flask_app or habit_app.create_app()
+    database_url = database_url or os.getenv('ASYNC_DATABASE_URL')
+    if not database_url:
+        # The engine's URL, after Flask-SQLAlchemy resolved relative SQLite paths
+        with flask_app.app_context():
+            database_url = async_database_url(db.engine.url)
+    engine = create_async_engine(database_url, **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+
+    routes = [
+        Route('/get_habits', get_habits),
+        Route('/habits_on_date/{date}', habits_on_date),
+        Route('/update_habit_completion/{habit_id:int}', update_habit_completion, methods=['PUT']),
+        Route('/notifications', notifications),
+        Route('/notifications/stream', notification_stream),
+        Route('/achievements', achievements),
+        Route('/categories', categories, methods=['GET', 'POST']),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ]
+    asgi_app = Starlette(routes=routes, middleware=[Middleware(RequestMetrics)])
+    asgi_app.state.flask_app = flask_app
+    asgi_app.state.engine = engine
+    asgi_app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    return asgi_app
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+
+# Static asset build: fingerprinted, minified and precompressed copies.
+#
+# ``build()`` writes every stylesheet and script under ``static/`` to
+# ``static/dist/`` with a content hash in its name, concatenates the bundles
+# below into single files, and stores ``.gz`` (and ``.br`` when the optional
+# brotli package is installed) variants next to each one. The mapping from
+# logical name to built file goes to ``dist/assets.json``. Because a name only
+# ever refers to one content, the built files can be cached forever.
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'assets.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+
+# Bundle name -> member files, in load order
+BUNDLES = {
+    'js/dashboard.js': ['js/habits.js', 'js/notifications.js', 'js/achievements.js',
+                        'js/notes.js', 'js/suggestions.js', 'js/main.js'],
+}
+
+HASH_LENGTH = 10
+COMPRESS_MIN_BYTES = 256
+
+
+def minify_css(text):
+    """Drop comments and collapse whitespace"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Strip indentation, blank lines and whole-line comments.
+
+    Deliberately conservative: line breaks are kept so automatic semicolon
+    insertion behaves exactly as in the source, and nothing inside a line is
+    touched, so strings and regex literals survive unchanged.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+def minify(name, text):
+    return minify_css(text) if name.endswith('.css') else minify_js(text)
+
+
+def fingerprint(name, data):
+    """``js/app.js`` -> ``js/app.<hash>.js``"""
+    digest = hashlib.sha1(data).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(name)
+    return f'{base}.{digest}{ext}'
+
+
+def _brotli():
+    try:
+        import brotli  # Optional: pip install brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compressed_variants(data):
+    """{suffix: bytes} for the encodings worth storing"""
+    if len(data) < COMPRESS_MIN_BYTES:
+        return {}
+    # mtime=0 keeps the output identical between builds of the same content
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+def source_files(static_dir):
+    """Logical names of the stylesheets and scripts under ``static_dir``"""
+    names = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(static_dir, DIST_DIR))
+        for filename in sorted(files):
+            if filename.endswith(ASSET_EXTENSIONS):
+                names.append(os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/'))
+    return names
+
+
+def build(static_dir):
+    """Build every asset and bundle into ``static_dir/dist``; returns the manifest"""
+    out_dir = os.path.join(static_dir, DIST_DIR)
+
+    def read(name):
+        with open(os.path.join(static_dir, name), encoding='utf-8') as f:
+            return f.read()
+
+    sources = {name: minify(name, read(name)) for name in source_files(static_dir)}
+    for bundle, members in BUNDLES.items():
+        # Separate members so one missing a trailing semicolon cannot merge into the next
+        sources[bundle] = ';\n'.join(sources.get(member) or minify(member, read(member)) for member in members)
+
+    manifest = {}
+    for name, text in sorted(sources.items()):
+        data = text.encode('utf-8')
+        built = fingerprint(name, data)
+        path = os.path.join(out_dir, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        for suffix, body in compressed_variants(data).items():
+            with open(path + suffix, 'wb') as f:
+                f.write(body)
+        manifest[name] = built
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir):
+    """The manifest of the last build, or {} when assets have not been built"""
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest_version(manifest):
+    """Short hash that changes whenever any built asset does"""
+    return hashlib.sha1(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
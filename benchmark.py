@@ -0,0 +1,408 @@
+"""Synthetic-data benchmarks for the hot routes.
+
+Seed a database, then drive the routes through the Flask test client:
+
+    python benchmark.py seed --users 200 --habits 5 --years 2
+    python benchmark.py run --save      # record benchmark_baseline.json
+    python benchmark.py run --cold --save
+    python benchmark.py run --check     # fail on regressions against it
+    python benchmark.py run --cold --check
+    python benchmark.py startup         # time import, app creation and first request
+    python benchmark.py load --save     # concurrent throughput, sync vs async serving
+
+Both commands use --database-url (default: a local benchmark.db SQLite file),
+so the same data can be loaded into PostgreSQL instead.
+"""
+import asyncio
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.abspath('benchmark.db')
+# Timings in the baseline are machine specific; re-save it on the machine that runs --check.
+# Warm (cached) and --cold results are kept in separate sections of the file.
+BASELINE_PATH = 'benchmark_baseline.json'
+# Last `load --save` results, kept next to the baseline for comparison across changes
+LOAD_RESULTS_PATH = 'benchmark_load.json'
+PASSWORD = 'benchmark'
+FREQUENCY_CHOICES = ('daily', 'daily', 'daily', 'weekly', 'monthly')
+
+
+def load_app(database_url):
+    """Import the app module and build an app against the benchmark database"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import app as habit_app
+    return habit_app, habit_app.create_app()
+
+
+def load_baseline():
+    """{'warm': {...}, 'cold': {...}} from BASELINE_PATH, or {} when it does not exist"""
+    try:
+        with open(BASELINE_PATH) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option('--database-url', default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option('--users', default=200, show_default=True)
+@click.option('--habits', default=5, show_default=True, help='Habits per user.')
+@click.option('--years', default=2, show_default=True, help='Years of completion history.')
+@click.option('--completion-rate', default=0.7, show_default=True)
+@click.option('--note-rate', default=0.05, show_default=True)
+@click.option('--seed', default=42, show_default=True)
+def seed(database_url, users, habits, years, completion_rate, note_rate, seed):
+    """Fill the database with synthetic users, habits, completions and notes"""
+    habit_app, app = load_app(database_url)
+    db = habit_app.db
+    rng = random.Random(seed)
+    today = date.today()
+    days = years * 365
+    # Hash once; bcrypt per user would dominate seeding time
+    password = habit_app.bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        db.session.execute(db.insert(habit_app.User), [
+            {'username': f'user{i}', 'password': password} for i in range(users)
+        ])
+        user_ids = [user_id for (user_id,) in db.session.query(habit_app.User.id)]
+        db.session.execute(db.insert(habit_app.Habit), [
+            {'user_id': user_id, 'habit_name': f'Habit {j}', 'habit_frequency': rng.choice(FREQUENCY_CHOICES),
+             'streak': 0}
+            for user_id in user_ids for j in range(habits)
+        ])
+        habit_rows = db.session.query(habit_app.Habit.id, habit_app.Habit.user_id).all()
+
+        completions = []
+        notes = []
+        for habit_id, user_id in habit_rows:
+            for offset in range(days):
+                day = today - timedelta(days=offset)
+                if rng.random() < completion_rate:
+                    completions.append({'habit_id': habit_id, 'user_id': user_id,
+                                        'completion_date': day, 'is_completed': True})
+                    if rng.random() < note_rate:
+                        notes.append({'habit_id': habit_id, 'user_id': user_id,
+                                      'note': f'Note for {day}', 'date': datetime.combine(day, datetime.min.time())})
+            if len(completions) >= habit_app.IMPORT_BATCH_SIZE:
+                db.session.execute(db.insert(habit_app.HabitCompletion), completions)
+                completions = []
+        if completions:
+            db.session.execute(db.insert(habit_app.HabitCompletion), completions)
+        if notes:
+            db.session.execute(db.insert(habit_app.HabitNote), notes)
+        db.session.commit()
+
+        # Derived state the routes read: bitmaps, streaks, rollups and leaderboard totals
+        runner = app.test_cli_runner()
+        runner.invoke(args=['build-completion-bitmaps'])
+        for habit in habit_app.Habit.query.all():
+            habit_app.update_habit_streak(habit, today)
+            habit_app.rebuild_habit_rollups(habit.id, habit.user_id)
+        db.session.commit()
+        runner.invoke(args=['rebuild-leaderboard'])
+
+        click.echo(f"Seeded {len(user_ids)} users, {len(habit_rows)} habits and "
+                   f"{habit_app.HabitCompletion.query.count()} completions")
+
+
+@cli.command()
+@click.option('--database-url', default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option('--requests', 'iterations', default=50, show_default=True, help='Requests per route.')
+@click.option('--cold', is_flag=True, help='Invalidate the result cache before every request.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--save', is_flag=True, help=f'Save the results as the warm or --cold baseline in {BASELINE_PATH}.')
+@click.option('--check', is_flag=True, help='Exit non-zero if a route regressed against the warm or --cold baseline.')
+@click.option('--tolerance', default=0.25, show_default=True, help='Allowed relative p95 slowdown before --check fails.')
+@click.option('--slack-ms', default=2.0, show_default=True, help='Absolute p95 slowdown always allowed, for timer noise.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured requests per route.')
+def run(database_url, iterations, cold, seed, save, check, tolerance, slack_ms, warmup):
+    """Drive the hot routes through the test client and report latency and query counts"""
+    habit_app, app = load_app(database_url)
+    db = habit_app.db
+    rng = random.Random(seed)
+    today = date.today().strftime('%Y-%m-%d')
+
+    with app.app_context():
+        username, user_id = rng.choice(db.session.query(habit_app.User.username, habit_app.User.id).all())
+        habit_ids = [habit_id for (habit_id,) in db.session.query(habit_app.Habit.id).filter_by(user_id=user_id)]
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+
+    routes = {
+        'dashboard': lambda: client.get('/dashboard'),
+        'analytics': lambda: client.get('/analytics'),
+        'leaderboard': lambda: client.get('/leaderboard'),
+        'habits_on_date': lambda: client.get(f'/habits_on_date/{today}'),
+        'update_habit_completion': lambda: client.put(
+            f'/update_habit_completion/{rng.choice(habit_ids)}', json={'is_completed': rng.random() < 0.5}),
+        'notifications': lambda: client.get('/notifications'),
+    }
+
+    results = {}
+    for name, request in routes.items():
+        timings = []
+        queries = []
+        for _ in range(warmup):
+            request()
+        for _ in range(iterations):
+            if cold:
+                habit_app.result_cache.invalidate(user_id)
+            del statements[:]
+            started = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(statements))
+            if response.status_code >= 400:
+                raise click.ClickException(f"{name} returned {response.status_code}")
+        results[name] = {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries)
+        }
+
+    click.echo(f"{'route':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for name, result in results.items():
+        click.echo(f"{name:<26}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                   f"{result['p99_ms']:>10.2f}{result['queries']:>9}")
+
+    mode = 'cold' if cold else 'warm'
+    if save:
+        # Rewrite the file from scratch: this run replaces its mode's section
+        # outright and only the other mode's section is carried over
+        other = 'warm' if cold else 'cold'
+        baselines = {key: value for key, value in load_baseline().items() if key == other}
+        baselines[mode] = results
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        click.echo(f"Saved {mode} baseline to {BASELINE_PATH}")
+
+    if check:
+        baseline = load_baseline().get(mode)
+        if not baseline:
+            raise click.ClickException(f"No {mode} baseline in {BASELINE_PATH}; record one with --save")
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if not expected:
+                continue
+            if result['p95_ms'] > expected['p95_ms'] * (1 + tolerance) + slack_ms:
+                regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms vs baseline {expected['p95_ms']:.2f} ms")
+            if result['queries'] > expected['queries']:
+                regressions.append(f"{name}: {result['queries']} queries vs baseline {expected['queries']}")
+        if regressions:
+            click.echo('Regressions:\n  ' + '\n  '.join(regressions), err=True)
+            sys.exit(1)
+        click.echo(f"No regressions against the {mode} baseline")
+
+
+# Run in a fresh interpreter per sample; prints the phase timings as JSON. The
+# forked child stands in for a gunicorn worker booted from a --preload master.
+STARTUP_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+import app as habit_app
+imported = time.perf_counter()
+app = habit_app.create_app()
+created = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+reader, writer = os.pipe()
+if os.fork() == 0:
+    forked = time.perf_counter()
+    app.test_client().get('/')
+    os.write(writer, str(time.perf_counter() - forked).encode())
+    os._exit(0)
+os.wait()
+worker = float(os.read(reader, 64))
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (served - created) * 1000, 'forked_worker_ms': worker * 1000}))
+"""
+
+
+@cli.command()
+@click.option('--database-url', default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option('--runs', default=10, show_default=True, help='Fresh interpreters to start.')
+def startup(database_url, runs):
+    """Time module import, create_app(), the first request and a preloaded worker's first request"""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True,
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    click.echo(f"{'phase':<20}{'p50 ms':>10}{'max ms':>10}")
+    for phase in ('import_ms', 'create_app_ms', 'first_request_ms', 'forked_worker_ms'):
+        values = [sample[phase] for sample in samples]
+        click.echo(f"{phase[:-3]:<20}{percentile(values, 50):>10.2f}{max(values):>10.2f}")
+
+
+# Servers compared by `load`; both get the same number of worker processes
+SERVER_COMMANDS = {
+    'sync': lambda port, workers: [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--workers', str(workers),
+                                   '--threads', '8', '--bind', f'127.0.0.1:{port}'],
+    'async': lambda port, workers: [sys.executable, '-m', 'uvicorn', 'asgi:create_asgi_app', '--factory',
+                                    '--workers', str(workers), '--port', str(port), '--log-level', 'warning'],
+}
+LOAD_PATHS = ('/get_habits', '/notifications', '/achievements', '/categories')
+
+
+def start_server(kind, port, workers, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    server = subprocess.Popen(SERVER_COMMANDS[kind](port, workers), env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise click.ClickException(f"{kind} server did not start on port {port}")
+
+
+def login_cookie(port, username):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', '/login', body=f'username={username}&password={PASSWORD}',
+                       headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+async def timed_get(port, path, cookie):
+    """Status and latency of one GET on a fresh connection"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+                     f'Connection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        return status, (time.perf_counter() - started) * 1000
+    finally:
+        writer.close()
+
+
+async def hold_stream(port, cookie):
+    """An EventSource client: keeps /notifications/stream open until cancelled"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET /notifications/stream HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+                     f'Accept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        while await reader.read(4096):
+            pass
+    finally:
+        writer.close()
+
+
+async def drive_load(port, cookie, concurrency, streams, duration, timeout):
+    holders = [asyncio.create_task(hold_stream(port, cookie)) for _ in range(streams)]
+    await asyncio.sleep(1)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            try:
+                status, latency = await asyncio.wait_for(timed_get(port, LOAD_PATHS[i % len(LOAD_PATHS)], cookie), timeout)
+                if status == 200:
+                    latencies.append(latency)
+                else:
+                    errors += 1
+            except (asyncio.TimeoutError, OSError, IndexError, ValueError):
+                errors += 1
+            i += 1
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    for holder in holders:
+        holder.cancel()
+    await asyncio.gather(*holders, return_exceptions=True)
+    return latencies, errors
+
+
+@cli.command()
+@click.option('--database-url', default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option('--server', 'servers', multiple=True, type=click.Choice(sorted(SERVER_COMMANDS)),
+              help='Servers to compare (default: all).')
+@click.option('--workers', default=2, show_default=True, help='Worker processes per server.')
+@click.option('--concurrency', default=50, show_default=True, help='Clients issuing JSON requests.')
+@click.option('--streams', default=32, show_default=True, help='Notification streams held open meanwhile.')
+@click.option('--duration', default=10, show_default=True, help='Seconds of load per server.')
+@click.option('--timeout', default=5.0, show_default=True, help='Seconds before a request counts as an error.')
+@click.option('--port', default=8610, show_default=True)
+@click.option('--save', is_flag=True, help=f'Write the results to {LOAD_RESULTS_PATH}.')
+def load(database_url, servers, workers, concurrency, streams, duration, timeout, port, save):
+    """Compare JSON throughput of the sync and async servers while notification streams are open"""
+    results = {}
+    for kind in servers or sorted(SERVER_COMMANDS):
+        server = start_server(kind, port, workers, database_url)
+        try:
+            cookie = login_cookie(port, 'user0')
+            latencies, errors = asyncio.run(drive_load(port, cookie, concurrency, streams, duration, timeout))
+        finally:
+            server.terminate()
+            server.wait()
+        results[kind] = (latencies, errors)
+
+    summary = {}
+    click.echo(f"{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for kind, (latencies, errors) in results.items():
+        p50 = percentile(latencies, 50) if latencies else float('nan')
+        p95 = percentile(latencies, 95) if latencies else float('nan')
+        click.echo(f"{kind:<8}{len(latencies) / duration:>10.1f}{p50:>10.2f}{p95:>10.2f}{errors:>8}")
+        summary[kind] = {'requests_per_second': round(len(latencies) / duration, 1), 'p50_ms': round(p50, 2),
+                         'p95_ms': round(p95, 2), 'errors': errors}
+
+    if save:
+        settings = {'workers': workers, 'concurrency': concurrency, 'streams': streams, 'duration': duration}
+        with open(LOAD_RESULTS_PATH, 'w') as results_file:
+            json.dump({'settings': settings, 'results': summary}, results_file, indent=2, sort_keys=True)
+            results_file.write('\n')
+        click.echo(f"Saved {LOAD_RESULTS_PATH}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,122 @@
+from datetime import date, timedelta
+
+from streaks import current_run, period_index, period_start
+
+# Per-habit, per-year completion bitmaps.
+#
+# Each year of a habit is stored as two bitmaps (completed and missed days):
+# bit ``n`` stands for day ``n`` of the year counted from January 1st. Masks
+# are plain Python ints in memory and little-endian bytes in the database.
+# Window reads, counts and "any completion in the period" checks are shifts,
+# ands and popcounts instead of scans over completion rows.
+
+YEAR_BYTES = 46  # 366 bits
+
+
+def encode(mask):
+    return mask.to_bytes(YEAR_BYTES, 'little')
+
+
+def decode(data):
+    return int.from_bytes(data, 'little') if data else 0
+
+
+def day_bit(day):
+    return (day - date(day.year, 1, 1)).days
+
+
+def year_masks(completions, completed=0, missed=0):
+    """Fold one year's (date, is_completed) pairs into (completed, missed) masks, later pairs winning"""
+    for day, is_completed in completions:
+        bit = 1 << day_bit(day)
+        if is_completed:
+            completed |= bit
+            missed &= ~bit
+        else:
+            missed |= bit
+            completed &= ~bit
+    return completed, missed
+
+
+def is_set(years, day):
+    """Whether ``day`` is set in a {year: mask} mapping"""
+    return bool((years.get(day.year, 0) >> day_bit(day)) & 1)
+
+
+def window_mask(years, start, end):
+    """Bits of a {year: mask} mapping for ``[start, end)``; bit i is ``start + i days``"""
+    mask = 0
+    for year in range(start.year, end.year + 1):
+        year_mask = years.get(year, 0)
+        if not year_mask:
+            continue
+        first = max(start, date(year, 1, 1))
+        last = min(end, date(year + 1, 1, 1))
+        if first >= last:
+            continue
+        length = (last - first).days
+        bits = (year_mask >> day_bit(first)) & ((1 << length) - 1)
+        mask |= bits << (first - start).days
+    return mask
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def mask_dates(mask, start):
+    """Dates whose bit is set, oldest first"""
+    dates = []
+    while mask:
+        low = mask & -mask
+        dates.append(start + timedelta(days=low.bit_length() - 1))
+        mask ^= low
+    return dates
+
+
+def bitstring(mask, days):
+    """'0'/'1' string with character i for bit i"""
+    return format(mask, f'0{days}b')[::-1] if days else ''
+
+
+def period_mask(mask, start, end, frequency):
+    """Fold a day mask over ``[start, end]`` into one bit per period with any completion.
+
+    Returns ``(mask, first_period, length)`` in the layout streaks.run_length expects.
+    """
+    first = period_index(start, frequency)
+    length = period_index(end, frequency) - first + 1
+    if frequency == 'daily':
+        return mask, first, length
+
+    periods = 0
+    for offset in range(length):
+        lo = max((period_start(first + offset, frequency) - start).days, 0)
+        hi = min((period_start(first + offset + 1, frequency) - start).days, (end - start).days + 1)
+        if (mask >> lo) & ((1 << (hi - lo)) - 1):
+            periods |= 1 << offset
+    return periods, first, length
+
+
+def current_streak(years, frequency, today):
+    """streaks.current_streak() computed from a {year: completed mask} mapping"""
+    years = {year: mask for year, mask in years.items() if mask}
+    if not years:
+        return 0
+    start = date(min(years), 1, 1)
+    mask = window_mask(years, start, today + timedelta(days=1))
+    if not mask:
+        return 0
+    # Start at the first completion, as the date-based version does
+    first_day = start + timedelta(days=(mask & -mask).bit_length() - 1)
+    mask >>= (first_day - start).days
+    periods, _, length = period_mask(mask, first_day, today, frequency)
+    return current_run(periods, length)
+
+
+def last_set(years):
+    """Latest day set in a {year: mask} mapping, or None"""
+    for year in sorted(years, reverse=True):
+        if years[year]:
+            return date(year, 1, 1) + timedelta(days=years[year].bit_length() - 1)
+    return None
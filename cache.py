@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-user result cache.
+#
+# Cached values are keyed by user and by that user's data version. Write paths
+# bump the version, which makes every older entry for the user unreachable; the
+# backend then ages those entries out on its own (LRU in-process, TTL on Redis).
+
+
+class MemoryBackend:
+    """In-process LRU backend, private to one worker process"""
+
+    # Other workers never see this one's versions
+    shared = False
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Versions are kept outside the LRU so an eviction can never roll a
+        # user's version back and resurrect stale entries
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+    def scope(self):
+        # Versions only count this process's writes, so tags must not match across workers
+        return f'pid{os.getpid()}'
+
+
+class RedisBackend:
+    """Shared backend so every gunicorn worker sees the same entries and versions.
+
+    Redis should be configured with an LRU ``maxmemory-policy``; entries also
+    carry a TTL so superseded versions expire even without memory pressure.
+    """
+
+    shared = True
+
+    def __init__(self, url, ttl=3600, prefix='habit-tracker'):
+        import redis  # Only needed when a shared cache is configured
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(f'{self.prefix}:result:{key}')
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(f'{self.prefix}:result:{key}', json.dumps(value), ex=self.ttl)
+
+    def version(self, user_id):
+        value = self.client.get(f'{self.prefix}:version:{user_id}')
+        return int(value) if value else 0
+
+    def bump(self, user_id):
+        self.client.incr(f'{self.prefix}:version:{user_id}')
+
+    def size(self):
+        return None
+
+    def scope(self):
+        return 'shared'
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after being set"""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def make_backend(url=None, max_entries=1024):
+    """Pick a backend from a ``CACHE_URL`` style setting"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    return MemoryBackend(max_entries)
+
+
+class ResultCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Counters are shared by the worker's threads
+        self._stats_lock = threading.Lock()
+
+    def fetch(self, user_id, name, compute, *parts):
+        """Return the cached result of ``compute()`` for this user, computing it on a miss"""
+        version = self.backend.version(user_id)
+        key = ':'.join(str(part) for part in (name, user_id, version) + parts)
+        value = self.backend.get(key)
+        if value is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return value
+        with self._stats_lock:
+            self.misses += 1
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def invalidate(self, user_id):
+        """Drop everything cached for a user after their data changed"""
+        self.backend.bump(user_id)
+
+    @property
+    def shared(self):
+        """Whether versions are seen by every worker, so they can stand in for the data they tag"""
+        return self.backend.shared
+
+    def version_tag(self, user_id):
+        """Opaque tag that changes whenever the user's data is invalidated"""
+        return f'{self.backend.scope()}.{self.backend.version(user_id)}'
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'entries': self.backend.size()
+        }
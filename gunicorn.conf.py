@@ -0,0 +1,23 @@
+import gc
+
+# Gunicorn settings, read automatically from the working directory.
+#
+# The app is loaded once in the master and workers are forked from it, so the
+# imported modules and compiled templates are shared copy-on-write instead of
+# being rebuilt by every worker.
+
+preload_app = True
+
+
+def when_ready(server):
+    # Everything allocated while loading the app lives as long as the process;
+    # freezing it keeps the workers' garbage collector from touching (and so
+    # copying) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Pooled connections must never be shared across processes; drop any the
+    # master opened so each worker connects on its own
+    from app import dispose_engines
+    dispose_engines(worker.app.wsgi())
@@ -0,0 +1,89 @@
+import threading
+from collections import Counter
+
+# Minimal in-process metrics registry rendered in the Prometheus text format.
+#
+# Each gunicorn worker keeps its own registry, so a scrape of /metrics reports
+# the worker that answered it; scrape every worker (or run a single one) for
+# complete numbers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels, **extra):
+    pairs = sorted(dict(labels, **extra).items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._histograms = {}
+        self._counters = {}
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ('histogram', help_text, buckets)
+
+    def counter(self, name, help_text):
+        self._meta[name] = ('counter', help_text, None)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self._meta[name][2])
+            self._histograms[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in sorted(self._meta.items()):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'counter':
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f'{name}{_labels(dict(labels))} {value}')
+                    continue
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    labels = dict(labels)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels, le=bound)} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def repeated_statements(statements, threshold):
+    """Statements run at least ``threshold`` times, the signature of an N+1 pattern"""
+    counts = Counter(statements)
+    return {statement: count for statement, count in counts.items() if count >= threshold}
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+# Password hashing on a bounded process pool.
+#
+# bcrypt is deliberately slow, so hashing runs in a small pool of helper
+# processes instead of inline in the request handler. At most ``max_pending``
+# hashes may be queued or running per web worker; beyond that callers get
+# HasherBusy straight away so the route can shed load with a 503.
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed):
+    """Work factor encoded in a ``$2b$<rounds>$...`` bcrypt hash"""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_pending=8, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        # Created on first use so each forked web worker gets its own pool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    def check(self, hashed, password):
+        return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
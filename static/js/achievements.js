@@ -1,6 +1,6 @@
 // Achievement functions
 function loadAchievements() {
-    $.get('/achievements', function(achievements) {
+    getJSONConditional('/achievements', function(achievements) {
         const container = $('#achievements-container');
         container.empty();
         
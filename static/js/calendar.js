@@ -1,4 +1,50 @@
 // Calendar initialization and functions
+
+// Completion matrix for the visible range, as returned by /habits_in_range
+let calendarRange = null;
+
+function toDateStr(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
+}
+
+function daysBetween(start, end) {
+    return Math.round((new Date(end + 'T00:00:00') - new Date(start + 'T00:00:00')) / 86400000);
+}
+
+// Load the whole visible window in one request and show a daily summary event
+function fetchCalendarEvents(info, successCallback, failureCallback) {
+    const start = toDateStr(info.start);
+    const end = toDateStr(info.end);
+
+    fetch(`/habits_in_range?start=${start}&end=${end}`)
+        .then(response => response.json())
+        .then(data => {
+            calendarRange = data;
+            const events = [];
+            const days = daysBetween(data.start, data.end);
+
+            for (let i = 0; i < days; i++) {
+                const done = data.habits.filter(habit => habit.completed[i] === '1').length;
+                if (done > 0) {
+                    const date = new Date(data.start + 'T00:00:00');
+                    date.setDate(date.getDate() + i);
+                    events.push({
+                        title: `${done}/${data.habits.length} completed`,
+                        start: toDateStr(date),
+                        allDay: true
+                    });
+                }
+            }
+            successCallback(events);
+        })
+        .catch(error => {
+            console.error('Error fetching calendar range:', error);
+            failureCallback(error);
+        });
+}
+
 function initializeCalendar() {
     const calendarEl = document.getElementById('calendar');
     if (!calendarEl) return;
@@ -11,7 +57,7 @@ function initializeCalendar() {
             right: 'dayGridMonth'
         },
         height: 'auto',
-        events: '/get_habits',
+        events: fetchCalendarEvents,
         eventDidMount: function(info) {
             info.el.style.cursor = 'pointer';
         },
@@ -19,8 +65,7 @@ function initializeCalendar() {
             fetchHabitsForDate(info.dateStr);
         },
         eventClick: function(info) {
-            const dateStr = info.event.start.toISOString().split('T')[0];
-            fetchHabitsForDate(dateStr);
+            fetchHabitsForDate(toDateStr(info.event.start));
         },
         eventContent: function(arg) {
             return {
@@ -37,6 +82,17 @@ function initializeCalendar() {
 }
 
 function fetchHabitsForDate(date) {
+    // Answer from the loaded range when possible, without another request
+    if (calendarRange && date >= calendarRange.start && date < calendarRange.end) {
+        const offset = daysBetween(calendarRange.start, date);
+        displayHabitsInModal(date, calendarRange.habits.map(habit => ({
+            habit_id: habit.habit_id,
+            habit_name: habit.habit_name,
+            is_completed: habit.completed[offset] === '1'
+        })));
+        return;
+    }
+
     fetch('/habits_on_date/' + date)
         .then(response => response.json())
         .then(data => {
@@ -27,13 +27,41 @@ $(document).ready(function() {
     handleHabitFormSubmission();
     handleHabitRemoval();
     handleNoteSaving();
+    handleNoteBrowsing();
     handleSuggestionAddition();
 
     // Modal overlay click handler
     $('#modal-overlay').on('click', closeModal);
 
+    // Offline cache of the app shell (see templates/sw.js)
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js', { updateViaCache: 'none' });
+    }
+
    
 });
 
 
 
+
+// Conditional GET for JSON endpoints: jQuery sends If-None-Match with the
+// ETag it last saw for the URL, and a 304 is answered from the body kept here
+const conditionalBodies = {};
+
+function getJSONConditional(url, onSuccess, onError) {
+    $.ajax({
+        url: url,
+        type: 'GET',
+        dataType: 'json',
+        ifModified: true,
+        success: function(data, status) {
+            if (status === 'notmodified') {
+                data = conditionalBodies[url];
+            } else {
+                conditionalBodies[url] = data;
+            }
+            onSuccess(data);
+        },
+        error: onError
+    });
+}
@@ -1,27 +1,81 @@
 // Note functions
 let currentHabitId = null;
+let nextNotesCursor = null;
+let noteSearchTimer = null;
 
 function openNoteModal(habitId) {
     currentHabitId = habitId;
+    $('#noteSearch').val('');
     loadPreviousNotes(habitId);
     $('#habitNoteModal').modal('show');
 }
 
+function renderNote(note) {
+    return `
+        <div class="card mb-2">
+            <div class="card-body">
+                <p class="card-text">${note.note}</p>
+                <small class="text-muted">${note.date}</small>
+            </div>
+        </div>
+    `;
+}
+
+// Newest page of a habit's notes; older pages are fetched on demand
 function loadPreviousNotes(habitId) {
-    $.get(`/habit/${habitId}/notes`, function(notes) {
+    loadNotesPage(habitId, null);
+}
+
+function loadNotesPage(habitId, cursor) {
+    let url = `/habit/${habitId}/notes`;
+    if (cursor) {
+        url += '?cursor=' + encodeURIComponent(cursor);
+    }
+    getJSONConditional(url, function(page) {
+        const container = $('#previousNotes');
+        if (!cursor) {
+            container.empty();
+        }
+        page.notes.forEach(note => container.append(renderNote(note)));
+        nextNotesCursor = page.next_cursor;
+        $('#loadMoreNotes').toggle(nextNotesCursor !== null);
+    });
+}
+
+function searchNotes(habitId, text) {
+    getJSONConditional(`/notes/search?habit_id=${habitId}&q=${encodeURIComponent(text)}`, function(result) {
         const container = $('#previousNotes');
         container.empty();
-        
-        notes.forEach(note => {
-            container.append(`
-                <div class="card mb-2">
-                    <div class="card-body">
-                        <p class="card-text">${note.note}</p>
-                        <small class="text-muted">${note.date}</small>
-                    </div>
-                </div>
-            `);
-        });
+
+        if (result.notes.length === 0) {
+            container.append('<p class="text-muted">No matching notes.</p>');
+        }
+        result.notes.forEach(note => container.append(renderNote(note)));
+        $('#loadMoreNotes').hide();
+    });
+}
+
+function handleNoteBrowsing() {
+    $('#loadMoreNotes').click(function() {
+        if (currentHabitId && nextNotesCursor) {
+            loadNotesPage(currentHabitId, nextNotesCursor);
+        }
+    });
+
+    $('#noteSearch').on('input', function() {
+        const text = $(this).val().trim();
+        clearTimeout(noteSearchTimer);
+        // Search once typing pauses rather than on every keystroke
+        noteSearchTimer = setTimeout(function() {
+            if (!currentHabitId) {
+                return;
+            }
+            if (text) {
+                searchNotes(currentHabitId, text);
+            } else {
+                loadPreviousNotes(currentHabitId);
+            }
+        }, 300);
     });
 }
 
@@ -36,6 +90,7 @@ function handleNoteSaving() {
                 data: JSON.stringify({ note: note }),
                 success: function(response) {
                     $('#habitNote').val('');
+                    $('#noteSearch').val('');
                     loadPreviousNotes(currentHabitId);
                     toastr.success('Note added successfully!');
                 },
@@ -1,22 +1,75 @@
 // Notification functions
+let currentNotifications = [];
+
+function renderNotifications() {
+    const container = $('#notifications-container');
+    container.empty();
+
+    if (currentNotifications.length === 0) {
+        container.append('<p>No new notifications.</p>');
+    } else {
+        currentNotifications.forEach(notification => {
+            container.append('<p>' + notification.message + '</p>');
+        });
+    }
+}
+
+// How often the page polls /notifications when no push stream is available
+const NOTIFICATION_POLL_MS = 30000;
+let notificationPoll = null;
+
 function loadNotifications() {
-    $.ajax({
-        url: '/notifications',
-        type: 'GET',
-        success: function(notifications) {
-            const container = $('#notifications-container');
-            container.empty();
-
-            if (notifications.length === 0) {
-                container.append('<p>No new notifications.</p>');
-            } else {
-                notifications.forEach(notification => {
-                    container.append('<p>' + notification.message + '</p>');
-                });
-            }
+    // Prefer the push stream; poll without EventSource
+    if (window.EventSource) {
+        subscribeNotifications();
+        return;
+    }
+    pollNotifications();
+}
+
+function fetchNotifications() {
+    getJSONConditional('/notifications',
+        function(notifications) {
+            currentNotifications = notifications;
+            renderNotifications();
         },
-        error: function() {
+        function() {
             $('#notifications-container').html('<p>Error loading notifications.</p>');
         }
+    );
+}
+
+function pollNotifications() {
+    // Unchanged notifications cost a 304 per poll
+    fetchNotifications();
+    if (notificationPoll === null) {
+        notificationPoll = setInterval(fetchNotifications, NOTIFICATION_POLL_MS);
+    }
+}
+
+function subscribeNotifications() {
+    // The browser reconnects on its own and sends Last-Event-ID, so the server
+    // only repeats the snapshot when it changed in the meantime
+    const source = new EventSource('/notifications/stream');
+
+    source.addEventListener('snapshot', function(event) {
+        currentNotifications = JSON.parse(event.data);
+        renderNotifications();
+    });
+
+    source.addEventListener('delta', function(event) {
+        const delta = JSON.parse(event.data);
+        const removed = delta.removed.map(notification => notification.message);
+        currentNotifications = currentNotifications
+            .filter(notification => !removed.includes(notification.message))
+            .concat(delta.added);
+        renderNotifications();
+    });
+
+    source.addEventListener('error', function() {
+        // Closed for good (the WSGI tier answers 204) rather than reconnecting
+        if (source.readyState === EventSource.CLOSED) {
+            pollNotifications();
+        }
     });
 }
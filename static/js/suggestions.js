@@ -1,9 +1,7 @@
 // Suggestion functions
 function fetchSuggestedHabits() {
-    $.ajax({
-        url: '/suggestions',
-        type: 'GET',
-        success: function(suggestions) {
+    getJSONConditional('/suggestions',
+        function(suggestions) {
             const suggestionsList = $('#suggestions-list');
             suggestionsList.empty();
 
@@ -24,10 +22,10 @@ function fetchSuggestedHabits() {
                 });                    
             }
         },
-        error: function() {
+        function() {
             $('#suggestions-list').html('<p>Error loading suggestions.</p>');
         }
-    });
+    );
 }
 
 function handleSuggestionAddition() {
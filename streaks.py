@@ -0,0 +1,184 @@
+from datetime import date, timedelta
+
+# Streak and completion series engine.
+#
+# A habit's completions are folded once into a bitset (a plain Python int)
+# indexed by period: bit i is set when period ``first + i`` has at least one
+# completion. Streaks and series are then read off the bitset, so the cost is
+# linear in the window length instead of dates x completions.
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+
+def period_index(day, frequency):
+    """Return an absolute, gap-free index for the period containing ``day``"""
+    if frequency == 'weekly':
+        # date.min is a Monday, so this buckets by ISO (Monday-based) week
+        return (day.toordinal() - 1) // 7
+    if frequency == 'monthly':
+        return day.year * 12 + day.month - 1
+    return day.toordinal()
+
+
+def period_start(index, frequency):
+    """First day of the period with absolute index ``index`` (inverse of period_index)"""
+    if frequency == 'weekly':
+        return date.fromordinal(index * 7 + 1)
+    if frequency == 'monthly':
+        return date(index // 12, index % 12 + 1, 1)
+    return date.fromordinal(index)
+
+
+def completion_mask(dates, frequency, first_period):
+    """Fold completed dates into a bitset of periods starting at ``first_period``"""
+    mask = 0
+    for day in dates:
+        offset = period_index(day, frequency) - first_period
+        if offset >= 0:
+            mask |= 1 << offset
+    return mask
+
+
+def run_length(mask, length):
+    """Number of consecutive set bits ending at bit ``length - 1``"""
+    if length <= 0:
+        return 0
+    window = (1 << length) - 1
+    gaps = ~mask & window
+    return length - gaps.bit_length()
+
+
+def run_lengths(mask, length):
+    """Running streak value for every period in ``[0, length)``"""
+    runs = []
+    current = 0
+    for offset in range(length):
+        current = current + 1 if (mask >> offset) & 1 else 0
+        runs.append(current)
+    return runs
+
+
+def current_streak(dates, frequency, today):
+    """Streak that is still alive as of ``today``.
+
+    The current period counts when it is completed; otherwise the streak ending
+    at the previous period is reported, since it can still be extended.
+    """
+    dates = list(dates)
+    if not dates:
+        return 0
+    first = min(period_index(day, frequency) for day in dates)
+    now = period_index(today, frequency)
+    mask = completion_mask(dates, frequency, first)
+    return current_run(mask, now - first + 1)
+
+
+def current_run(mask, length):
+    """Run ending at the last period if it is set, otherwise at the one before it"""
+    if length <= 0:
+        return 0
+    if (mask >> (length - 1)) & 1:
+        return run_length(mask, length)
+    return run_length(mask, length - 1)
+
+
+def _is_period_end(day, frequency):
+    if frequency == 'weekly':
+        return day.weekday() == 6
+    if frequency == 'monthly':
+        return (day + timedelta(days=1)).day == 1
+    return True
+
+
+def date_labels(end, days):
+    """``YYYY-MM-DD`` labels for the ``days`` dates ending at ``end`` (oldest first)"""
+    start = end - timedelta(days=days - 1)
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+
+def completion_series(dates, frequency, end, days):
+    """Per-day completion and streak series for the window ending at ``end``.
+
+    Weekly and monthly habits report the completion of the whole period on every
+    day of it, and the streak only on the last day of the period (or ``end``).
+    """
+    start = end - timedelta(days=days - 1)
+    first = period_index(start, frequency)
+    length = period_index(end, frequency) - first + 1
+    mask = completion_mask((d for d in dates if start <= d <= end), frequency, first)
+    runs = run_lengths(mask, length)
+
+    completion = []
+    streak = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        offset = period_index(day, frequency) - first
+        completion.append((mask >> offset) & 1)
+        if day == end or _is_period_end(day, frequency):
+            streak.append(runs[offset])
+        else:
+            streak.append(None)
+    return completion, streak
+
+
+def period_rollups(completions, frequency, first_period=None, seed=0):
+    """Sparse ``(period, completed, not_completed, streak)`` tuples for one habit.
+
+    ``completions`` yields ``(date, is_completed)`` pairs. Only periods from
+    ``first_period`` onwards are produced, with ``seed`` being the streak of the
+    period just before it.
+    """
+    counts = {}
+    for day, is_completed in completions:
+        index = period_index(day, frequency)
+        if first_period is not None and index < first_period:
+            continue
+        done, missed = counts.get(index, (0, 0))
+        counts[index] = (done + 1, missed) if is_completed else (done, missed + 1)
+
+    rollups = []
+    last = None if first_period is None else first_period - 1
+    streak = seed
+    for index in sorted(counts):
+        done, missed = counts[index]
+        if done:
+            streak = streak + 1 if last is not None and index == last + 1 else 1
+            last = index
+            rollups.append((index, done, missed, streak))
+        else:
+            rollups.append((index, done, missed, 0))
+    return rollups
+
+
+def pack_month(completions):
+    """Fold one month's (date, is_completed) pairs into (completed_days, missed_days) masks.
+
+    Bit ``day - 1`` of each mask stands for that day of the month.
+    """
+    completed = missed = 0
+    for day, is_completed in completions:
+        bit = 1 << (day.day - 1)
+        if is_completed:
+            completed |= bit
+            missed &= ~bit
+        else:
+            missed |= bit
+            completed &= ~bit
+    return completed, missed
+
+
+def merge_month(archived, recent):
+    """Overlay ``recent`` month masks on ``archived`` ones; days present in ``recent`` win"""
+    present = recent[0] | recent[1]
+    return (archived[0] & ~present) | recent[0], (archived[1] & ~present) | recent[1]
+
+
+def unpack_month(month, completed, missed):
+    """(date, is_completed) pairs recorded in a month's masks, in date order"""
+    pairs = []
+    for offset in range(max(completed.bit_length(), missed.bit_length())):
+        if (completed >> offset) & 1:
+            pairs.append((month + timedelta(days=offset), True))
+        elif (missed >> offset) & 1:
+            pairs.append((month + timedelta(days=offset), False))
+    return pairs
@@ -0,0 +1,80 @@
+// Offline cache of the app shell.
+//
+// Fingerprinted assets never change under the same URL, so they are precached
+// on install and then answered from the cache without touching the network.
+// Pages go to the network first and fall back to their last cached copy when
+// offline; JSON endpoints are left alone (they revalidate with ETags).
+// Third-party libraries are cached only from the CDN hosts below and only
+// under URLs that pin a version, so a cached copy can never go stale; the
+// templates load them with crossorigin so the responses are not opaque.
+const VERSION = {{ version|tojson }};
+const SHELL_CACHE = 'habit-tracker-shell-' + VERSION;
+const PAGE_CACHE = 'habit-tracker-pages';
+const CDN_CACHE = 'habit-tracker-cdn-v2';
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com', 'code.jquery.com'];
+// "bootstrap@5.3.0/", "/5.15.4/" or "jquery-3.6.0.min.js"
+const PINNED_VERSION = /[@/-]\d+\.\d+\.\d+[/.]/;
+const SHELL = {{ shell|tojson }};
+const PAGES = ['/dashboard', '/calendar', '/analytics', '/leaderboard'];
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => cache.addAll(SHELL))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', function(event) {
+    // Drop the shells of previous builds, and CDN caches that may hold unpinned or opaque copies
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                .filter(key => (key.startsWith('habit-tracker-shell-') && key !== SHELL_CACHE) ||
+                               (key.startsWith('habit-tracker-cdn') && key !== CDN_CACHE))
+                .map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+function cacheFirst(request, cacheName) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        // Opaque responses hide their status, so an error page could be kept forever
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(cacheName).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+function networkFirst(request) {
+    return fetch(request).then(response => {
+        if (response.ok && !response.redirected) {
+            const copy = response.clone();
+            caches.open(PAGE_CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }).catch(() => caches.match(request));
+}
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (CDN_HOSTS.includes(url.hostname) && PINNED_VERSION.test(url.pathname)) {
+            event.respondWith(cacheFirst(request, CDN_CACHE));
+        }
+    } else if (url.pathname.startsWith('/assets/')) {
+        event.respondWith(cacheFirst(request, SHELL_CACHE));
+    } else if (url.pathname === '/logout') {
+        // Cached pages hold the user's data; forget them on the way out
+        event.respondWith(caches.delete(PAGE_CACHE).then(() => fetch(request)));
+    } else if (request.mode === 'navigate' && PAGES.includes(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    }
+});
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+
+PASSWORD = 'password'
+
+
+@pytest.fixture
+def habit_app():
+    import app as habit_app
+    return habit_app
+
+
+@pytest.fixture
+def app(habit_app, tmp_path):
+    from cache import MemoryBackend
+
+    app = habit_app.create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    # Module-level caches outlive apps; ids restart with every database
+    habit_app.result_cache.backend = MemoryBackend()
+    habit_app.user_cache._entries.clear()
+    with app.app_context():
+        habit_app.db.create_all()
+    yield app
+    with app.app_context():
+        habit_app.db.engine.dispose()
+
+
+def signup(client, username):
+    client.post('/signup', data={'username': username, 'password': PASSWORD})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    return client
+
+
+@pytest.fixture
+def client(app):
+    return signup(app.test_client(), 'alice')
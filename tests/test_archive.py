@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+
+
+def test_archived_days_survive_a_raised_horizon(app, client, habit_app, monkeypatch):
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    (habit,) = client.get('/get_habits').get_json()
+    day = date.today() - timedelta(days=450)
+    client.post('/update_habit_status', json={
+        'habit_id': habit['id'], 'completion_date': day.isoformat(), 'is_completed': True})
+
+    result = app.test_cli_runner().invoke(args=['compact-completions'])
+    assert 'Archived 1 completions' in result.output
+
+    # Raising the setting moves completion_horizon() back past the archived month
+    monkeypatch.setattr(habit_app, 'COMPLETION_HOT_DAYS', 1000)
+    with app.app_context():
+        assert habit_app.completion_horizon(date.today()) <= day
+        assert habit_app.completion_history([habit['id']], day, day + timedelta(days=1)) == [
+            (habit['id'], day, True)]
+
+    (on_date,) = client.get(f'/habits_on_date/{day.isoformat()}').get_json()
+    assert on_date['is_completed'] is True
+    in_range = client.get(f'/habits_in_range?start={day.isoformat()}'
+                          f'&end={(day + timedelta(days=2)).isoformat()}').get_json()
+    assert in_range['habits'][0]['completed'] == '10'
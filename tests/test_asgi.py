@@ -0,0 +1,158 @@
+import asyncio
+from datetime import date
+
+import httpx
+import pytest
+
+from cache import MemoryBackend
+from conftest import signup
+
+import asgi
+
+
+class SharedBackend(MemoryBackend):
+    shared = True
+
+
+def make_app(habit_app, path):
+    app = habit_app.create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        habit_app.db.create_all()
+    return app
+
+
+def parity_requests(today):
+    # (method, path, json) of the six async routes, reads before and after writes
+    reads = [
+        ('GET', '/get_habits', None),
+        ('GET', f'/habits_on_date/{today}', None),
+        ('GET', '/notifications', None),
+        ('GET', '/achievements', None),
+        ('GET', '/categories', None),
+    ]
+    writes = [
+        ('PUT', '/update_habit_completion/1', {'is_completed': True}),
+        ('PUT', '/update_habit_completion/99', {'is_completed': True}),
+        ('POST', '/categories', {'name': 'Health', 'color': '#00ff00'}),
+        ('POST', '/categories', {}),
+    ]
+    return reads + writes + reads
+
+
+@pytest.mark.parametrize('backend', [MemoryBackend, SharedBackend])
+def test_async_tier_matches_flask(habit_app, tmp_path, backend):
+    """Both tiers answer the same requests with the same status, JSON and ETag.
+
+    Each tier gets its own identical database and cache backend, so neither
+    can serve the other's cached results.
+    """
+    flask_app = make_app(habit_app, tmp_path / 'flask.db')
+    async_app = make_app(habit_app, tmp_path / 'async.db')
+    backends = {'flask': backend(), 'async': backend()}
+    habit_app.user_cache._entries.clear()
+
+    flask_client = flask_app.test_client()
+    for tier, app in (('flask', flask_app), ('async', async_app)):
+        habit_app.result_cache.backend = backends[tier]
+        client = signup(app.test_client() if tier == 'async' else flask_client, 'alice')
+        client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+        client.post('/add_habit', json={'habit_name': 'Read', 'habit_frequency': 'weekly'})
+    # Same secret key and user id on both databases, so one session cookie serves both tiers
+    cookie = flask_client.get_cookie('session').value
+
+    async def scenario():
+        asgi_app = asgi.create_asgi_app(async_app)
+        transport = httpx.ASGITransport(app=asgi_app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://localhost',
+                                         cookies={'session': cookie}) as async_client:
+                for method, path, body in parity_requests(date.today().isoformat()):
+                    habit_app.result_cache.backend = backends['flask']
+                    expected = flask_client.open(path, method=method, json=body)
+                    habit_app.result_cache.backend = backends['async']
+                    actual = await async_client.request(method, path, json=body)
+
+                    assert actual.status_code == expected.status_code, path
+                    assert actual.json() == expected.get_json(), path
+                    assert actual.headers.get('ETag') == expected.headers.get('ETag'), path
+
+                    if 'ETag' in expected.headers:
+                        # Either tier's ETag revalidates on the other
+                        revalidated = await async_client.get(path, headers={'If-None-Match': expected.headers['ETag']})
+                        assert revalidated.status_code == 304, path
+        finally:
+            await asgi_app.state.engine.dispose()
+
+    asyncio.run(scenario())
+    for app in (flask_app, async_app):
+        with app.app_context():
+            habit_app.db.engine.dispose()
+
+
+@pytest.mark.parametrize('resync, rebuilt', [(60, False), (0, True)])
+def test_stream_rebuilds_only_on_change_or_resync(habit_app, tmp_path, monkeypatch, resync, rebuilt):
+    """An idle stream over an in-process cache rebuilds only at the coarse resync interval"""
+    app = make_app(habit_app, tmp_path / 'stream.db')
+    habit_app.result_cache.backend = MemoryBackend()
+    habit_app.user_cache._entries.clear()
+    client = signup(app.test_client(), 'alice')
+    cookie = client.get_cookie('session').value
+
+    calls = []
+    build = habit_app.build_notifications
+    monkeypatch.setattr(habit_app, 'build_notifications', lambda *args: calls.append(args) or build(*args))
+    monkeypatch.setattr(habit_app, 'NOTIFICATION_POLL_SECONDS', 0.01)
+    monkeypatch.setattr(habit_app, 'NOTIFICATION_STREAM_SECONDS', 0.05)
+    monkeypatch.setattr(habit_app, 'NOTIFICATION_RESYNC_SECONDS', resync)
+
+    async def scenario():
+        asgi_app = asgi.create_asgi_app(app)
+        transport = httpx.ASGITransport(app=asgi_app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://localhost',
+                                         cookies={'session': cookie}) as async_client:
+                response = await async_client.get('/notifications/stream')
+                assert response.status_code == 200
+                assert 'event: snapshot' in response.text
+        finally:
+            await asgi_app.state.engine.dispose()
+
+    asyncio.run(scenario())
+    # The snapshot is always built; polls only rebuild on a resync
+    assert (len(calls) > 1) == rebuilt
+    with app.app_context():
+        habit_app.db.engine.dispose()
+
+
+def test_async_routes_feed_request_metrics(habit_app, tmp_path):
+    app = make_app(habit_app, tmp_path / 'metrics.db')
+    habit_app.result_cache.backend = MemoryBackend()
+    habit_app.user_cache._entries.clear()
+    client = signup(app.test_client(), 'alice')
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    cookie = client.get_cookie('session').value
+    before = habit_app.metrics.render()
+
+    async def scenario():
+        asgi_app = asgi.create_asgi_app(app)
+        transport = httpx.ASGITransport(app=asgi_app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://localhost',
+                                         cookies={'session': cookie}) as async_client:
+                assert (await async_client.get('/get_habits')).status_code == 200
+        finally:
+            await asgi_app.state.engine.dispose()
+
+    asyncio.run(scenario())
+    after = habit_app.metrics.render()
+
+    def sample(text, line_start):
+        return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(line_start))
+
+    requests = 'habit_tracker_requests_total{endpoint="main.get_habits",method="GET",status="200"}'
+    statements = 'habit_tracker_sql_statements_total{endpoint="main.get_habits"}'
+    assert sample(after, requests) == sample(before, requests) + 1
+    # The habits query runs through run_shared() on the async engine
+    assert sample(after, statements) >= sample(before, statements) + 1
+    with app.app_context():
+        habit_app.db.engine.dispose()
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import bitmaps
+
+
+def setup_habit(client):
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    return client.get('/get_habits').get_json()[0]['id']
+
+
+def set_status(client, habit_id, day, completed):
+    client.post('/update_habit_status', json={
+        'habit_id': habit_id, 'completion_date': day.isoformat(), 'is_completed': completed})
+
+
+def stored_masks(habit_app, habit_id, year):
+    bitmap = habit_app.db.session.get(habit_app.CompletionBitmap, (habit_id, year))
+    return bitmaps.decode(bitmap.completed), bitmaps.decode(bitmap.missed)
+
+
+def rebuilt_masks(habit_app, habit_id, year):
+    first = date(year, 1, 1)
+    return bitmaps.year_masks((day, completed) for _, day, completed in habit_app.completion_history(
+        [habit_id], first, first.replace(year=year + 1)))
+
+
+def test_writes_set_and_clear_single_bits(app, client, habit_app, monkeypatch):
+    monkeypatch.setattr(habit_app, 'BITMAPS_ENABLED', True)
+    habit_id = setup_habit(client)
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in (1, 2, 3)]
+    for day in days:
+        set_status(client, habit_id, day, True)
+    set_status(client, habit_id, days[1], False)
+    client.put(f'/update_habit_completion/{habit_id}', json={'is_completed': True})
+    response = client.post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': habit_id, 'completion_date': days[2].isoformat(), 'is_completed': False}]})
+    assert response.status_code == 200
+
+    with app.app_context():
+        for year in {day.year for day in days + [today]}:
+            assert stored_masks(habit_app, habit_id, year) == rebuilt_masks(habit_app, habit_id, year)
+        completed, missed = stored_masks(habit_app, habit_id, today.year)
+        assert completed >> bitmaps.day_bit(today) & 1
+        if days[1].year == today.year:
+            assert missed >> bitmaps.day_bit(days[1]) & 1
+
+
+def test_bitmaps_are_not_maintained_while_disabled(app, client, habit_app, monkeypatch):
+    monkeypatch.setattr(habit_app, 'BITMAPS_ENABLED', False)
+    habit_id = setup_habit(client)
+    set_status(client, habit_id, date.today() - timedelta(days=1), True)
+    client.put(f'/update_habit_completion/{habit_id}', json={'is_completed': True})
+    with app.app_context():
+        assert habit_app.CompletionBitmap.query.count() == 0
+
+
+def test_streaks_load_every_habits_bitmaps_in_one_query(app, client, habit_app, monkeypatch):
+    monkeypatch.setattr(habit_app, 'BITMAPS_ENABLED', True)
+    for name in ('Run', 'Read', 'Swim'):
+        client.post('/add_habit', json={'habit_name': name, 'habit_frequency': 'daily'})
+    habit_ids = [habit['id'] for habit in client.get('/get_habits').get_json()]
+    today = date.today()
+    response = client.post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': habit_id, 'completion_date': (today - timedelta(days=offset)).isoformat(), 'is_completed': True}
+        for i, habit_id in enumerate(habit_ids) for offset in range(i + 1)]})
+    assert response.status_code == 200
+
+    with app.app_context():
+        habits = habit_app.Habit.query.order_by(habit_app.Habit.id).all()
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        habit_app.event.listen(habit_app.db.engine, 'before_cursor_execute', listener)
+        try:
+            habit_app.update_habit_streaks(habits, today)
+        finally:
+            habit_app.event.remove(habit_app.db.engine, 'before_cursor_execute', listener)
+        assert len([s for s in statements if 'habit_completion_bitmaps' in s]) == 1
+        sql_streaks = habit_app.habit_streaks(habit_ids, today)
+        assert [habit.streak for habit in habits] == [1, 2, 3]
+        assert {habit.id: (habit.streak, habit.last_completed) for habit in habits} == sql_streaks
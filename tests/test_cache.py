@@ -0,0 +1,90 @@
+import threading
+
+from cache import MemoryBackend, ResultCache, TTLCache
+
+
+def test_invalidate_makes_older_entries_unreachable():
+    cache = ResultCache(MemoryBackend())
+    assert cache.fetch(1, 'habits', lambda: ['a']) == ['a']
+    assert cache.fetch(1, 'habits', lambda: ['b']) == ['a']
+    tag = cache.version_tag(1)
+    cache.invalidate(1)
+    assert cache.version_tag(1) != tag
+    assert cache.fetch(1, 'habits', lambda: ['b']) == ['b']
+    # Other users are untouched
+    assert cache.fetch(2, 'habits', lambda: ['c']) == ['c']
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert backend.get('a') == 1
+    assert backend.get('b') is None
+    assert backend.size() == 2
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set('user', {'id': 1})
+    now[0] += 9
+    assert cache.get('user') == {'id': 1}
+    now[0] += 2
+    assert cache.get('user') is None
+
+
+def test_counters_are_exact_under_threads():
+    cache = ResultCache(MemoryBackend())
+    cache.fetch(1, 'habits', lambda: [])
+
+    def hammer():
+        for _ in range(2000):
+            cache.fetch(1, 'habits', lambda: [])
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()['hits'] == 16000
+    assert cache.stats()['misses'] == 1
+
+
+def test_cache_stats_are_only_exposed_through_metrics(client, habit_app, monkeypatch):
+    assert client.get('/cache_stats').status_code == 404
+    monkeypatch.setattr(habit_app, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert b'habit_tracker_cache_entries' in response.data
+
+
+class SharedBackend(MemoryBackend):
+    """Stands in for Redis: one backend seen by every worker"""
+    shared = True
+
+
+def test_private_backend_etag_follows_the_body(client, habit_app):
+    etag = client.get('/categories').headers['ETag']
+    assert client.get('/categories', headers={'If-None-Match': etag}).status_code == 304
+
+    # A write handled by another worker leaves this worker's version untouched
+    worker = habit_app.result_cache.backend
+    habit_app.result_cache.backend = MemoryBackend()
+    client.post('/categories', json={'name': 'Health'})
+    habit_app.result_cache.backend = worker
+
+    response = client.get('/categories', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [category['name'] for category in response.get_json()] == ['Health']
+
+
+def test_shared_backend_etag_follows_the_version(client, habit_app):
+    habit_app.result_cache.backend = SharedBackend()
+    etag = client.get('/categories').headers['ETag']
+    assert client.get('/categories', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/categories', json={'name': 'Health'})
+    assert client.get('/categories', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.mark.parametrize('bitmaps_enabled', [False, True])
+def test_range_returns_one_bitstring_per_habit(app, client, habit_app, monkeypatch, bitmaps_enabled):
+    monkeypatch.setattr(habit_app, 'BITMAPS_ENABLED', bitmaps_enabled)
+    for name in ('Run', 'Read'):
+        client.post('/add_habit', json={'habit_name': name, 'habit_frequency': 'daily'})
+    run, read = [habit['id'] for habit in client.get('/get_habits').get_json()]
+    start = date.today() - timedelta(days=6)
+    client.post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': run, 'completion_date': (start + timedelta(days=offset)).isoformat(), 'is_completed': completed}
+        for offset, completed in ((0, True), (2, True), (3, False), (6, True))]})
+
+    # end is exclusive: a week from start
+    response = client.get('/habits_in_range', query_string={
+        'start': start.isoformat(), 'end': (start + timedelta(days=7)).isoformat()})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['start'] == start.isoformat()
+    assert {habit['habit_id']: habit['completed'] for habit in body['habits']} == {run: '1010001', read: '0000000'}
+
+    for query in ({'start': start.isoformat()}, {'start': 'soon', 'end': start.isoformat()},
+                  {'start': start.isoformat(), 'end': start.isoformat()},
+                  {'start': start.isoformat(), 'end': (start + timedelta(days=400)).isoformat()}):
+        assert client.get('/habits_in_range', query_string=query).status_code == 400
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+from datetime import date
+
+
+def test_upgrade_db_runs_each_data_migration_once(app, habit_app, client):
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    with app.app_context():
+        # A database from before the unique index, holding a duplicate day
+        habit_app.db.session.execute(habit_app.db.text('DROP INDEX uq_habit_completions_habit_date'))
+        for completed in (False, True):
+            habit_app.db.session.add(habit_app.HabitCompletion(
+                habit_id=1, user_id=1, completion_date=date(2024, 1, 1), is_completed=completed))
+        habit_app.db.session.commit()
+
+    runner = app.test_cli_runner()
+    first = runner.invoke(args=['upgrade-db'])
+    assert first.exit_code == 0, first.output
+    assert 'Removed 1 duplicate habit completions' in first.output
+    assert 'Leaderboard rebuilt' in first.output
+    with app.app_context():
+        (completion,) = habit_app.HabitCompletion.query.all()
+        assert completion.is_completed
+        assert habit_app.db.session.get(habit_app.SchemaVersion, 1).version == len(habit_app.UPGRADE_STEPS)
+        indexes = habit_app.db.inspect(habit_app.db.engine).get_indexes('habit_completions')
+        assert 'uq_habit_completions_habit_date' in {index['name'] for index in indexes}
+
+    second = runner.invoke(args=['upgrade-db'])
+    assert second.exit_code == 0, second.output
+    assert 'duplicate' not in second.output
+    assert 'Leaderboard rebuilt' not in second.output
+    assert f'Data migrations are up to date (version {len(habit_app.UPGRADE_STEPS)})' in second.output
+
+
+def test_init_db_marks_new_databases_as_migrated(app, habit_app):
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    result = runner.invoke(args=['upgrade-db'])
+    assert result.exit_code == 0, result.output
+    assert 'Leaderboard rebuilt' not in result.output
+
+
+def test_build_assets_writes_fingerprinted_files_and_manifest(app, tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('dist'))
+    app.static_folder = str(static)
+
+    result = app.test_cli_runner().invoke(args=['build-assets'])
+    assert result.exit_code == 0, result.output
+    manifest = json.loads((static / 'dist' / 'assets.json').read_text())
+    assert f'Built {len(manifest)} assets into {static / "dist"}' in result.output
+    assert 'js/dashboard.js' in manifest and 'styles.css' in manifest
+    for name, built in manifest.items():
+        assert built != name
+        assert os.path.isfile(static / 'dist' / built)
+
+    # Unchanged sources build to the same names
+    assert app.test_cli_runner().invoke(args=['build-assets']).exit_code == 0
+    assert json.loads((static / 'dist' / 'assets.json').read_text()) == manifest
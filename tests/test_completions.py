@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import signup
+
+
+def add_habit(client, name='Run'):
+    client.post('/add_habit', json={'habit_name': name, 'habit_frequency': 'daily'})
+    return [habit['id'] for habit in client.get('/get_habits').get_json() if habit['habit_name'] == name][0]
+
+
+def completions(habit_app):
+    return sorted((row.habit_id, row.completion_date, row.is_completed)
+                  for row in habit_app.HabitCompletion.query.all())
+
+
+def test_rewriting_a_day_upserts_one_row(app, client, habit_app):
+    habit_id = add_habit(client)
+    yesterday = date.today() - timedelta(days=1)
+    for is_completed in (True, False, True):
+        response = client.post('/update_habit_status', json={
+            'habit_id': habit_id, 'completion_date': yesterday.isoformat(), 'is_completed': is_completed})
+        assert response.status_code == 200
+    for is_completed in (True, False):
+        client.put(f'/update_habit_completion/{habit_id}', json={'is_completed': is_completed})
+
+    with app.app_context():
+        assert completions(habit_app) == [(habit_id, yesterday, True), (habit_id, date.today(), False)]
+        # The unique (habit_id, completion_date) index backs the upsert
+        habit_app.db.session.add(habit_app.HabitCompletion(
+            habit_id=habit_id, user_id=1, completion_date=yesterday, is_completed=False))
+        with pytest.raises(IntegrityError):
+            habit_app.db.session.commit()
+
+
+def test_bulk_update_writes_every_entry_in_one_transaction(app, client, habit_app):
+    run, read = add_habit(client, 'Run'), add_habit(client, 'Read')
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in range(3)]
+    entries = [{'habit_id': run, 'completion_date': day.isoformat(), 'is_completed': True} for day in days]
+    entries += [
+        {'habit_id': read, 'completion_date': today.isoformat(), 'is_completed': True},
+        # A later entry for the same habit and day wins
+        {'habit_id': read, 'completion_date': today.isoformat(), 'is_completed': False},
+    ]
+    response = client.post('/update_habit_status/bulk', json={'entries': entries})
+    assert response.status_code == 200
+    assert response.get_json()['streaks'] == {str(run): 3, str(read): 0}
+    with app.app_context():
+        assert completions(habit_app) == sorted([(run, day, True) for day in days] + [(read, today, False)])
+
+    # One habit the user does not own rejects the whole batch
+    response = signup(app.test_client(), 'bob').post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': run, 'completion_date': today.isoformat(), 'is_completed': False}]})
+    assert response.status_code == 404
+    assert response.get_json()['habit_ids'] == [run]
+    with app.app_context():
+        assert (run, today, True) in completions(habit_app)
+
+    for body in ({}, {'entries': [{'habit_id': run}]}, {'entries': [{'habit_id': run, 'completion_date': '2024-13-01'}]}):
+        assert client.post('/update_habit_status/bulk', json=body).status_code == 400
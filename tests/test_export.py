@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from conftest import signup
+
+
+def test_export_streams_the_users_history_within_the_range(app, client, habit_app, monkeypatch):
+    # Small chunks, so the export spans several partitions of the cursor
+    monkeypatch.setattr(habit_app, 'EXPORT_CHUNK_SIZE', 2)
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    habit_id = client.get('/get_habits').get_json()[0]['id']
+    start = date.today() - timedelta(days=9)
+    days = [start + timedelta(days=offset) for offset in range(10)]
+    client.post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': habit_id, 'completion_date': day.isoformat(), 'is_completed': True} for day in days]})
+    other = signup(app.test_client(), 'bob')
+    other.post('/add_habit', json={'habit_name': 'Swim', 'habit_frequency': 'daily'})
+    other.put(f'/update_habit_completion/{habit_id + 1}', json={'is_completed': True})
+
+    query = {'start': days[2].isoformat(), 'end': days[6].isoformat()}
+    response = client.get('/export/completions.csv', query_string=query)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=completions.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    # Both bounds are inclusive
+    assert [row['completion_date'] for row in rows] == [day.isoformat() for day in days[2:7]]
+    assert {row['user_id'] for row in rows} == {'1'}
+
+    response = client.get('/export/completions.ndjson', query_string=query)
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['completion_date'] for record in records] == [day.isoformat() for day in days[2:7]]
+
+    habits = client.get('/export/habits.ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['habit_name'] for line in habits] == ['Run']
+
+    assert client.get('/export/passwords.csv').status_code == 404
+    assert client.get('/export/notes.csv', query_string={'start': 'yesterday'}).status_code == 400
+
+    # The admin export covers every user
+    result = app.test_cli_runner().invoke(args=['export-all', 'habits'])
+    assert result.exit_code == 0, result.output
+    assert [row['habit_name'] for row in csv.DictReader(io.StringIO(result.output))] == ['Run', 'Swim']
@@ -0,0 +1,50 @@
+import io
+
+
+def upload(client, text, filename='history.csv', encoding='utf-8'):
+    return client.post('/import', data={'file': (io.BytesIO(text.encode(encoding)), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_frequencies_are_normalized(client):
+    response = upload(client, 'habit_name,habit_frequency,completion_date\n'
+                              'Run,WEEKLY,2024-01-01\n'
+                              'Read,,2024-01-02\n'
+                              'Stretch, monthly ,\n')
+    assert response.status_code == 200
+    frequencies = {habit['habit_name']: habit['habit_frequency'] for habit in client.get('/get_habits').get_json()}
+    assert frequencies == {'Run': 'Weekly', 'Read': 'Daily', 'Stretch': 'Monthly'}
+
+
+def test_unknown_frequency_is_rejected_with_its_row(client):
+    response = upload(client, 'habit_name,habit_frequency\n'
+                              'Run,daily\n'
+                              'Read,fortnightly\n')
+    assert response.status_code == 400
+    assert 'Row 2' in response.get_json()['message']
+    # Nothing from the file is kept
+    assert client.get('/get_habits').get_json() == []
+
+
+def test_byte_order_mark_and_quoted_line_breaks_are_read(client):
+    response = upload(client, 'habit_name,habit_frequency,completion_date\r\n'
+                              '"Stretch\r\nand breathe",daily,2024-01-01\r\n', encoding='utf-8-sig')
+    assert response.status_code == 200
+    assert [habit['habit_name'] for habit in client.get('/get_habits').get_json()] == ['Stretch\r\nand breathe']
+
+
+def test_duplicate_rows_and_reimports_keep_one_completion_per_day(app, client, habit_app):
+    history = ('habit_name,habit_frequency,completion_date,is_completed\n'
+               'Run,daily,2024-01-01,true\n'
+               'Run,daily,2024-01-01,true\n'
+               'Run,daily,2024-01-02,false\n')
+    for _ in range(2):
+        response = upload(client, history)
+        assert response.status_code == 200
+        assert response.get_json()['rows'] == 3
+
+    assert len(client.get('/get_habits').get_json()) == 1
+    with app.app_context():
+        rows = habit_app.db.session.query(habit_app.HabitCompletion.completion_date,
+                                          habit_app.HabitCompletion.is_completed).order_by('completion_date').all()
+    assert [(day.isoformat(), completed) for day, completed in rows] == [('2024-01-01', True), ('2024-01-02', False)]
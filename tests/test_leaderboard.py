@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+
+def add_habits(client, *frequencies):
+    for i, frequency in enumerate(frequencies):
+        client.post('/add_habit', json={'habit_name': f'habit {i}', 'habit_frequency': frequency})
+    return client.get('/get_habits').get_json()
+
+
+def total(habit_app, user_id=1):
+    return habit_app.db.session.get(habit_app.LeaderboardEntry, user_id).total_streak
+
+
+def complete_days(client, habit_id, days):
+    for offset in range(1, days + 1):
+        client.post('/update_habit_status', json={
+            'habit_id': habit_id,
+            'completion_date': (date.today() - timedelta(days=offset)).isoformat(),
+            'is_completed': True
+        })
+
+
+def test_total_follows_streaks_and_removals(app, client, habit_app):
+    first, second = add_habits(client, 'daily', 'daily')
+    complete_days(client, first['id'], 3)
+    complete_days(client, second['id'], 2)
+    with app.app_context():
+        assert total(habit_app) == 5
+
+    client.delete(f"/remove_habit/{first['id']}")
+    with app.app_context():
+        assert total(habit_app) == 2
+
+
+def test_stale_streak_does_not_drift_the_total(app, client, habit_app):
+    (habit,) = add_habits(client, 'daily')
+    complete_days(client, habit['id'], 3)
+    with app.app_context():
+        # A second request that loaded the habit before the first one committed
+        stale = habit_app.db.session.get(habit_app.Habit, habit['id'])
+        stale.streak = 0
+        habit_app.update_habit_streak(stale, date.today())
+        habit_app.db.session.commit()
+        assert total(habit_app) == 3
+
+
+def test_upgrade_db_backfills_missing_entries(app, client, habit_app):
+    (habit,) = add_habits(client, 'daily')
+    complete_days(client, habit['id'], 2)
+    with app.app_context():
+        habit_app.LeaderboardEntry.query.delete()
+        habit_app.db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert total(habit_app) == 2
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from conftest import signup
+
+
+def add_habit(client, name='Run'):
+    client.post('/add_habit', json={'habit_name': name, 'habit_frequency': 'daily'})
+    return [habit['id'] for habit in client.get('/get_habits').get_json() if habit['habit_name'] == name][0]
+
+
+def search(client, text, **params):
+    response = client.get('/notes/search', query_string=dict(params, q=text))
+    assert response.status_code == 200
+    return [note['note'] for note in response.get_json()['notes']]
+
+
+def test_pages_do_not_skip_or_repeat_notes_sharing_a_date(app, client, habit_app):
+    habit_id = add_habit(client)
+    for i in range(7):
+        client.post(f'/habit/{habit_id}/notes', json={'note': f'note {i}'})
+    with app.app_context():
+        # Three notes share one timestamp, straddling the page boundaries
+        notes = habit_app.HabitNote.query.order_by(habit_app.HabitNote.id).all()
+        for note in notes[1:4]:
+            note.date = datetime(2024, 3, 1, 8, 0)
+        habit_app.db.session.commit()
+        expected = [note.id for note in sorted(notes, key=lambda note: (note.date, note.id), reverse=True)]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        page = client.get(f'/habit/{habit_id}/notes', query_string=params).get_json()
+        seen.extend(note['id'] for note in page['notes'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+
+    assert client.get(f'/habit/{habit_id}/notes', query_string={'cursor': 'bogus'}).status_code == 400
+
+
+def test_search_matches_every_word_and_the_last_as_a_prefix(client):
+    run = add_habit(client, 'Run')
+    read = add_habit(client, 'Read')
+    client.post(f'/habit/{run}/notes', json={'note': 'Morning running felt easy'})
+    client.post(f'/habit/{run}/notes', json={'note': 'Evening run in the rain'})
+    client.post(f'/habit/{read}/notes', json={'note': 'Read in the morning sun'})
+
+    assert sorted(search(client, 'morn')) == ['Morning running felt easy', 'Read in the morning sun']
+    assert search(client, 'morning runn') == ['Morning running felt easy']
+    assert search(client, 'morn', habit_id=read) == ['Read in the morning sun']
+    # Only the last word is a prefix
+    assert search(client, 'morn running') == []
+    # FTS syntax in the query is treated as plain text
+    assert search(client, 'rain OR "') == []
+    assert client.get('/notes/search').status_code == 400
+
+
+def test_search_is_scoped_to_the_user(app, client):
+    habit_id = add_habit(client)
+    client.post(f'/habit/{habit_id}/notes', json={'note': 'private thoughts'})
+    other = signup(app.test_client(), 'bob')
+    assert search(other, 'priv') == []
+    assert search(client, 'priv') == ['private thoughts']
@@ -0,0 +1,10 @@
+def test_wsgi_tier_declines_the_stream(client):
+    # 204 makes EventSource stop reconnecting; the page polls /notifications instead
+    response = client.get('/notifications/stream')
+    assert response.status_code == 204
+    assert response.data == b''
+
+
+def test_polling_revalidates_with_etags(client):
+    etag = client.get('/notifications').headers['ETag']
+    assert client.get('/notifications', headers={'If-None-Match': etag}).status_code == 304
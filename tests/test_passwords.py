@@ -0,0 +1,29 @@
+from conftest import PASSWORD, signup
+from passwords import PasswordHasher
+
+
+def exhaust_hasher(habit_app, monkeypatch):
+    # Hold the only slot, so the next hash is refused before it is queued
+    hasher = PasswordHasher(rounds=4, max_pending=1)
+    assert hasher._slots.acquire(blocking=False)
+    monkeypatch.setattr(habit_app, 'password_hasher', hasher)
+
+
+def test_pending_hashes_leave_threads_for_other_routes(habit_app):
+    assert habit_app.HASH_MAX_PENDING < habit_app.WSGI_THREADS
+
+
+def test_signup_sheds_load_while_hashing_is_busy(app, habit_app, monkeypatch):
+    exhaust_hasher(habit_app, monkeypatch)
+    response = app.test_client().post('/signup', data={'username': 'bob', 'password': PASSWORD})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_login_sheds_load_while_hashing_is_busy(app, habit_app, monkeypatch):
+    client = signup(app.test_client(), 'bob')
+    client.get('/logout')
+    exhaust_hasher(habit_app, monkeypatch)
+    response = client.post('/login', data={'username': 'bob', 'password': PASSWORD})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,46 @@
+import shutil
+from datetime import date, timedelta
+
+from cache import MemoryBackend
+from conftest import signup
+
+
+def habit_names(client):
+    today = date.today()
+    response = client.get('/habits_in_range', query_string={
+        'start': today.isoformat(), 'end': (today + timedelta(days=1)).isoformat()})
+    assert response.status_code == 200
+    return [habit['habit_name'] for habit in response.get_json()['habits']]
+
+
+def test_reads_go_to_the_replica_except_right_after_a_write(habit_app, tmp_path, monkeypatch):
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    monkeypatch.setattr(habit_app, 'REPLICA_BINDS', ['replica0'])
+    # db registers a metadata per bind key; keep the replica's out of later apps
+    monkeypatch.setattr(habit_app.db, 'metadatas', dict(habit_app.db.metadatas))
+    app = habit_app.create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+                                'SQLALCHEMY_BINDS': {'replica0': f'sqlite:///{replica}'}})
+    habit_app.result_cache.backend = MemoryBackend()
+    habit_app.user_cache._entries.clear()
+    with app.app_context():
+        habit_app.db.create_all()
+
+    client = signup(app.test_client(), 'alice')
+    client.post('/add_habit', json={'habit_name': 'Run', 'habit_frequency': 'daily'})
+    # The replica is a snapshot that has not seen the next write
+    with app.app_context():
+        habit_app.db.engine.dispose()
+    shutil.copy(primary, replica)
+    client.post('/add_habit', json={'habit_name': 'Read', 'habit_frequency': 'daily'})
+
+    # Within REPLICA_STICKY_SECONDS of the user's write, reads stay on the primary
+    assert habit_names(client) == ['Run', 'Read']
+
+    monkeypatch.setattr(habit_app, 'REPLICA_STICKY_SECONDS', 0)
+    assert habit_names(client) == ['Run']
+    # Routes without @read_replica always use the primary
+    assert [habit['habit_name'] for habit in client.get('/get_habits').get_json()] == ['Run', 'Read']
+
+    with app.app_context():
+        for engine in habit_app.db.engines.values():
+            engine.dispose()
@@ -0,0 +1,96 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.orm import Query
+
+
+def add_habits(client):
+    for name, frequency in (('Run', 'daily'), ('Read', 'weekly'), ('Call', 'monthly')):
+        client.post('/add_habit', json={'habit_name': name, 'habit_frequency': frequency})
+    return [habit['id'] for habit in client.get('/get_habits').get_json()]
+
+
+def set_statuses(client, entries):
+    response = client.post('/update_habit_status/bulk', json={'entries': [
+        {'habit_id': habit_id, 'completion_date': day.isoformat(), 'is_completed': completed}
+        for habit_id, day, completed in entries]})
+    assert response.status_code == 200
+
+
+def rollup_rows(habit_app):
+    return sorted((row.habit_id, row.period, row.period_start, row.completed, row.not_completed, row.streak)
+                  for row in habit_app.HabitRollup.query.all())
+
+
+def by_label(analytics):
+    for key in ('chart_data', 'streak_chart_data'):
+        for chart in analytics[key].values():
+            chart['datasets'].sort(key=lambda dataset: dataset['label'])
+    return analytics
+
+
+def test_writes_only_queue_rollups_while_disabled(app, client, habit_app, monkeypatch):
+    monkeypatch.setattr(habit_app, 'ROLLUPS_ENABLED', False)
+    habit_id = add_habits(client)[0]
+    today = date.today()
+    set_statuses(client, [(habit_id, today - timedelta(days=3), True)])
+    set_statuses(client, [(habit_id, today - timedelta(days=9), False)])
+    client.put(f'/update_habit_completion/{habit_id}', json={'is_completed': True})
+
+    with app.app_context():
+        assert habit_app.HabitRollup.query.count() == 0
+        entry = habit_app.db.session.get(habit_app.RollupQueue, habit_id)
+        assert entry.since == today - timedelta(days=9)
+        assert entry.version == 3
+
+
+def test_worker_drains_the_queue_without_rescanning(app, client, habit_app, monkeypatch):
+    monkeypatch.setattr(habit_app, 'ROLLUPS_ENABLED', False)
+    habit_ids = add_habits(client)
+    today = date.today()
+    set_statuses(client, [(habit_id, today - timedelta(days=1), True) for habit_id in habit_ids])
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['rollup-worker']).exit_code == 0
+
+    set_statuses(client, [(habit_ids[0], today, True)])
+    result = runner.invoke(args=['rollup-worker'])
+    assert result.exit_code == 0
+    assert 'Rebuilt rollups of 1 queued habits' in result.output
+    assert 'Rolled up' not in result.output
+
+    with app.app_context():
+        assert habit_app.RollupQueue.query.count() == 0
+        drained = rollup_rows(habit_app)
+        for habit_id in habit_ids:
+            habit_app.rebuild_habit_rollups(habit_id, 1)
+        assert rollup_rows(habit_app) == drained
+        assert (habit_ids[0], 'daily', today, 1, 0, 2) in drained
+
+
+def test_rebuild_upserts_over_rows_it_did_not_delete(app, client, habit_app, monkeypatch):
+    habit_id = add_habits(client)[0]
+    set_statuses(client, [(habit_id, date.today(), True)])
+    with app.app_context():
+        habit_app.rebuild_habit_rollups(habit_id, 1)
+        expected = rollup_rows(habit_app)
+        # As if a concurrent rebuild inserted the same keys after this one's DELETE ran
+        monkeypatch.setattr(Query, 'delete', lambda self, synchronize_session=None: 0)
+        habit_app.rebuild_habit_rollups(habit_id, 1)
+        habit_app.db.session.commit()
+        assert rollup_rows(habit_app) == expected
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_analytics_from_rollups_match_completions(app, client, habit_app, monkeypatch, seed):
+    monkeypatch.setattr(habit_app, 'ROLLUPS_ENABLED', True)
+    rng = random.Random(seed)
+    habit_ids = add_habits(client)
+    today = date.today()
+    set_statuses(client, [(habit_id, today - timedelta(days=offset), rng.random() < 0.6)
+                          for habit_id in habit_ids for offset in range(120) if rng.random() < 0.7])
+
+    with app.app_context():
+        for days in (7, 30, 90):
+            assert by_label(habit_app.build_analytics_from_rollups(1, today, days)) == \
+                by_label(habit_app.build_analytics(1, today, days))
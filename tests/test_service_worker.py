@@ -0,0 +1,20 @@
+import glob
+import os
+import re
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+def test_every_cdn_url_is_pinned_and_cors(client):
+    sw = client.get('/sw.js').get_data(as_text=True)
+    hosts = re.findall(r"'([\w.]+)'", re.search(r'const CDN_HOSTS = \[(.*)\];', sw)[1])
+    pinned = re.compile(re.search(r'const PINNED_VERSION = /(.*)/;', sw)[1])
+
+    for path in glob.glob(os.path.join(TEMPLATES, '*.html')):
+        with open(path, encoding='utf-8') as f:
+            for tag in re.findall(r'<(?:script|link)[^>]*https://[^>]*>', f.read()):
+                url = re.search(r'https://([^/"]+)(/[^"]*)', tag)
+                assert url[1] in hosts, tag
+                assert pinned.search(url[2]), tag
+                # Without CORS the response is opaque and the service worker will not keep it
+                assert 'crossorigin="anonymous"' in tag, tag
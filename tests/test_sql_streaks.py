@@ -0,0 +1,62 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import streaks
+
+
+def write(habit_app, truth, habit_id, days):
+    """Upsert {day: is_completed} for a habit and record it as the expected history"""
+    habit_app.upsert_completions([{'habit_id': habit_id, 'user_id': 1, 'completion_date': day,
+                                   'is_completed': completed} for day, completed in days.items()])
+    truth[habit_id].update(days)
+
+
+def expected(truth, frequencies, today):
+    return {habit_id: streaks.current_streak([day for day, completed in days.items() if completed],
+                                             frequencies[habit_id], today)
+            for habit_id, days in truth.items()}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sql_current_streak_matches_python_across_the_archive(app, client, habit_app, seed):
+    rng = random.Random(seed)
+    today = date.today()
+    specs = [('daily', 1.0), ('daily', 0.8), ('weekly', 0.3), ('monthly', 0.2), ('daily', 0.5)]
+
+    with app.app_context():
+        db = habit_app.db
+        habits = [habit_app.Habit(user_id=1, habit_name=f'habit {i}', habit_frequency=frequency.capitalize())
+                  for i, (frequency, _) in enumerate(specs)]
+        db.session.add_all(habits)
+        db.session.flush()
+        frequencies = {habit.id: frequency for habit, (frequency, _) in zip(habits, specs)}
+        truth = {habit.id: {} for habit in habits}
+        # Two years of history, so runs cross the hot horizon (COMPLETION_HOT_DAYS days back)
+        for habit, (_, rate) in zip(habits, specs):
+            days = {}
+            for offset in range(1, 730):
+                if rng.random() < rate:
+                    days[today - timedelta(days=offset)] = True
+                elif rng.random() < 0.5:
+                    days[today - timedelta(days=offset)] = False
+            write(habit_app, truth, habit.id, days)
+        db.session.commit()
+        ids = [habit.id for habit in habits]
+
+    result = app.test_cli_runner().invoke(args=['compact-completions'])
+    assert 'Archived' in result.output
+
+    with app.app_context():
+        assert habit_app.CompletionArchive.query.count() > 0
+        horizon = habit_app.completion_horizon(today)
+        # Late writes into archived months land in the hot table and must override the archive
+        for habit_id in ids:
+            write(habit_app, truth, habit_id, {horizon - timedelta(days=rng.randrange(1, 300)): rng.random() < 0.5
+                                               for _ in range(20)})
+        habit_app.db.session.commit()
+
+        for day in (today, today - timedelta(days=1), horizon + timedelta(days=3)):
+            computed = {habit_id: current for habit_id, (current, _) in habit_app.habit_streaks(ids, day).items()}
+            assert {habit_id: computed.get(habit_id, 0) for habit_id in ids} == expected(truth, frequencies, day)
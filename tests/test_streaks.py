@@ -0,0 +1,123 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import streaks
+from streaks import FREQUENCIES, period_index, period_start
+
+TODAY = date(2024, 3, 13)  # a Wednesday
+
+
+def naive_periods(dates, frequency):
+    return {period_index(day, frequency) for day in dates}
+
+
+def naive_current_streak(dates, frequency, today):
+    """Walk back period by period; the open period may still be pending"""
+    periods = naive_periods(dates, frequency)
+    period = period_index(today, frequency)
+    if period not in periods:
+        period -= 1
+    count = 0
+    while period in periods:
+        count += 1
+        period -= 1
+    return count
+
+
+def random_dates(rng, days=400, rate=0.6):
+    return [TODAY - timedelta(days=offset) for offset in range(days) if rng.random() < rate]
+
+
+@pytest.mark.parametrize('frequency', FREQUENCIES)
+def test_period_start_inverts_period_index(frequency):
+    day = date(2023, 12, 25)
+    for offset in range(120):
+        current = day + timedelta(days=offset)
+        index = period_index(current, frequency)
+        assert period_index(period_start(index, frequency), frequency) == index
+        assert period_start(index, frequency) <= current
+
+
+def test_weekly_periods_start_on_monday():
+    assert period_start(period_index(TODAY, 'weekly'), 'weekly') == date(2024, 3, 11)
+    assert period_index(date(2024, 3, 10), 'weekly') + 1 == period_index(date(2024, 3, 11), 'weekly')
+
+
+def test_monthly_periods_are_gap_free_across_years():
+    assert period_index(date(2024, 1, 1), 'monthly') == period_index(date(2023, 12, 31), 'monthly') + 1
+
+
+def test_run_length():
+    # Bit length - 1 is the latest period
+    assert streaks.run_length(0b1110, 4) == 3
+    assert streaks.run_length(0b1011, 4) == 1
+    assert streaks.run_length(0b1101, 4) == 2
+    assert streaks.run_length(0b0111, 4) == 0
+    assert streaks.run_length(0b0111, 3) == 3
+    assert streaks.run_length(0, 5) == 0
+    assert streaks.run_length(0b1, 0) == 0
+
+
+def test_current_streak_counts_the_pending_period():
+    yesterday = TODAY - timedelta(days=1)
+    dates = [yesterday - timedelta(days=i) for i in range(3)]
+    assert streaks.current_streak(dates, 'daily', TODAY) == 3
+    assert streaks.current_streak(dates + [TODAY], 'daily', TODAY) == 4
+    # A gap before yesterday breaks the streak
+    assert streaks.current_streak([TODAY - timedelta(days=2)], 'daily', TODAY) == 0
+
+
+def test_current_streak_ignores_future_completions():
+    assert streaks.current_streak([TODAY + timedelta(days=1)], 'daily', TODAY) == 0
+
+
+def test_current_streak_without_completions():
+    assert streaks.current_streak([], 'weekly', TODAY) == 0
+
+
+@pytest.mark.parametrize('frequency', FREQUENCIES)
+@pytest.mark.parametrize('seed', range(20))
+def test_current_streak_matches_naive(frequency, seed):
+    rng = random.Random(seed)
+    dates = random_dates(rng, rate=rng.choice((0.2, 0.6, 0.95)))
+    assert streaks.current_streak(dates, frequency, TODAY) == naive_current_streak(dates, frequency, TODAY)
+
+
+@pytest.mark.parametrize('frequency', FREQUENCIES)
+@pytest.mark.parametrize('seed', range(10))
+def test_completion_series_matches_naive(frequency, seed):
+    rng = random.Random(seed)
+    dates = random_dates(rng, rate=0.5)
+    days = 90
+    completion, streak = streaks.completion_series(dates, frequency, TODAY, days)
+    start = TODAY - timedelta(days=days - 1)
+    window = [day for day in dates if start <= day <= TODAY]
+    periods = naive_periods(window, frequency)
+    first = period_index(start, frequency)
+
+    assert len(completion) == len(streak) == days
+    for i in range(days):
+        day = start + timedelta(days=i)
+        period = period_index(day, frequency)
+        assert completion[i] == (1 if period in periods else 0)
+        if streak[i] is not None:
+            run = 0
+            while period - run >= first and period - run in periods:
+                run += 1
+            assert streak[i] == run
+    assert streak[-1] is not None
+
+
+def test_period_rollups_resume_from_seed():
+    days = [date(2024, 3, 1) + timedelta(days=i) for i in range(6)]
+    full = streaks.period_rollups([(day, True) for day in days], 'daily')
+    first = period_index(days[3], 'daily')
+    resumed = streaks.period_rollups([(day, True) for day in days], 'daily', first_period=first, seed=full[2][3])
+    assert resumed == full[3:]
+
+
+def test_period_rollups_record_missed_periods():
+    rollups = streaks.period_rollups([(TODAY, False), (TODAY, False)], 'daily')
+    assert rollups == [(period_index(TODAY, 'daily'), 0, 2, 0)]